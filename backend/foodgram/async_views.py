@@ -0,0 +1,67 @@
+"""Асинхронные варианты нагруженных представлений для режима ASGI.
+
+В Django 3.2 нет асинхронного ORM, а синхронные представления под ASGI
+выполняются в единственном общем потоке процесса. Поэтому маршруты
+ASYNC_ROUTES получают асинхронные обёртки, которые выполняют то же
+представление DRF - с аутентификацией, фильтрами, кэшем ответов и
+сериализацией - в пуле потоков asgiref (размер задаёт ASGI_THREADS).
+Медленный запрос к базе занимает один поток пула, а цикл событий
+продолжает принимать и обслуживать остальные запросы.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from foodgram.middleware import timed_queries
+
+# Имена маршрутов роутера DRF, обслуживаемых асинхронно.
+ASYNC_ROUTES = {
+    'recipes-list',
+    'recipes-detail',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+    'users-subscriptions',
+}
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет представление и отрисовывает ответ в потоке пула.
+
+    Соединения с базой у каждого потока свои: учёт запросов подключается
+    к ним на время представления, а по завершении они закрываются по тем
+    же правилам CONN_MAX_AGE, что и после обычного запроса.
+    """
+    try:
+        with timed_queries():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run_view, thread_sensitive=False)(
+            view, request, *args, **kwargs
+        )
+    return wrapper
+
+
+def async_urls(urlpatterns, names=ASYNC_ROUTES):
+    """Заменяет представления маршрутов names асинхронными обёртками."""
+    return [
+        URLPattern(
+            pattern.pattern, async_view(pattern.callback),
+            pattern.default_args, pattern.name,
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in urlpatterns
+    ]
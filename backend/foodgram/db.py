@@ -0,0 +1,30 @@
+"""Вспомогательные запросы к базе данных."""
+from django.db import connections, router
+
+
+def insert_ignore(model, **values):
+    """Вставляет строку одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает True, если строка добавлена, и False, если она нарушила
+    бы ограничение уникальности. В отличие от проверки exists() перед
+    create() результат верен и при параллельных запросах. Ключи values -
+    имена полей модели или их attname (user_id).
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in values]
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    params = [
+        field.get_db_prep_save(
+            getattr(value, 'pk', value), connection=connection
+        )
+        for field, value in zip(fields, values.values())
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+            f'VALUES ({placeholders}) ON CONFLICT DO NOTHING',
+            params,
+        )
+        return cursor.rowcount == 1
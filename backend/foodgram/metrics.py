@@ -0,0 +1,94 @@
+"""Метрики Prometheus по действиям API.
+
+Для каждого действия вьюсета (recipes.list, users.subscriptions и т.д.)
+собираются гистограммы длительности и числа запросов к базе, счётчики
+ответов по классам статусов и ошибок, а для кэшей ответов - счётчики
+попаданий и промахов. Показатели запроса берутся из RequestTiming
+промежуточного слоя foodgram.middleware.
+
+Если задана переменная окружения PROMETHEUS_MULTIPROC_DIR, каждый
+воркер gunicorn пишет значения в свои файлы в этом каталоге, а
+/metrics отдаёт их сумму по всем воркерам.
+"""
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'API request latency.',
+    ('action', 'method'),
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'foodgram_requests',
+    'API responses by status class.',
+    ('action', 'method', 'status'),
+)
+ERRORS = Counter(
+    'foodgram_request_errors',
+    'API responses with a 5xx status.',
+    ('action', 'method'),
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries',
+    'Database queries per API request.',
+    ('action',),
+    buckets=QUERY_BUCKETS,
+)
+DB_LATENCY = Histogram(
+    'foodgram_db_duration_seconds',
+    'Total database time per API request.',
+    ('action',),
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    'foodgram_cache_lookups',
+    'Response cache lookups by result: hit, stale or miss.',
+    ('cache', 'result'),
+)
+
+UNMATCHED = 'unmatched'
+
+
+def observe_request(request, response, timing):
+    action = timing.action or UNMATCHED
+    method = request.method
+    REQUEST_LATENCY.labels(action, method).observe(timing.total)
+    REQUESTS.labels(action, method, f'{response.status_code // 100}xx').inc()
+    if response.status_code >= 500:
+        ERRORS.labels(action, method).inc()
+    DB_QUERIES.labels(action).observe(timing.queries)
+    DB_LATENCY.labels(action).observe(timing.db)
+
+
+def observe_cache(cache, result):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def get_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics(request):
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,323 @@
+"""Промежуточные слои API: измерение стоимости запросов и выбор базы.
+
+RequestTimingMiddleware считает для каждого запроса число запросов к
+базе, их суммарное время, время сериализации и время работы
+представления. Итоги отдаются заголовком Server-Timing и строкой журнала
+foodgram.timing в формате JSON; для медленных запросов в журнал
+попадают и их SQL-запросы. При METRICS_ENABLED показатели также
+передаются в метрики foodgram.metrics.
+
+Учёт дешёвый: запросы к базе перехватываются execute_wrapper без
+форматирования параметров, а SQL хранится ссылками на строки и не более
+REQUEST_TIMING_MAX_QUERIES штук. Обёртка подключается к соединениям
+только на время запроса и снимается после него, поэтому на постоянных
+соединениях обёртки не накапливаются. Время сериализации не исключено из
+времени базы: ленивые выборки могут выполняться при сериализации.
+
+Показатели текущего запроса хранятся в контекстной переменной, поэтому
+запросы к базе учитываются и в потоках, где асинхронные представления
+выполняют синхронный код: foodgram.async_views подключает обёртку к
+соединениям потока пула через timed_queries.
+
+ReplicaRoutingMiddleware выбирает для запроса реплику базы, из которой
+foodgram.routers.PrimaryReplicaRouter будет читать.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+from foodgram import metrics
+from foodgram.routers import checked_connections, choose_replica, read_alias
+
+logger = logging.getLogger('foodgram.timing')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+current_timing = ContextVar('current_timing', default=None)
+
+
+class RequestTiming:
+    """Накопленные показатели одного запроса, длительности в секундах."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.view_start = None
+        self.action = None
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.view = 0.0
+        self.total = 0.0
+        self.statements = []
+        self.serializing = False
+        self.querying = False
+        self.token = None
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db += duration
+        if len(self.statements) < settings.REQUEST_TIMING_MAX_QUERIES:
+            self.statements.append((sql, duration))
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'view;dur={self.view * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'queries': self.queries,
+            'db_ms': round(self.db * 1000, 1),
+            'serializer_ms': round(self.serializer * 1000, 1),
+            'view_ms': round(self.view * 1000, 1),
+            'total_ms': round(self.total * 1000, 1),
+        }
+
+
+def view_action(view_func):
+    """Имя действия DRF вида basename.action или путь к представлению."""
+    actions = getattr(view_func, 'actions', None)
+    initkwargs = getattr(view_func, 'initkwargs', {})
+    if actions and 'basename' in initkwargs:
+        return initkwargs['basename'], actions
+    return f'{view_func.__module__}.{view_func.__name__}', None
+
+
+def timed_data(data):
+    """Оборачивает свойство data сериализаторов: учитывается только
+    внешний сериализатор, вложенные входят в его время."""
+    def wrapper(serializer):
+        timing = current_timing.get()
+        if timing is None or timing.serializing:
+            return data(serializer)
+        timing.serializing = True
+        start = perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            timing.serializer += perf_counter() - start
+            timing.serializing = False
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument_serializers():
+    data = BaseSerializer.data
+    if not getattr(data.fget, 'timed', False):
+        BaseSerializer.data = property(timed_data(data.fget))
+
+
+def record_query(execute, sql, params, many, context):
+    """Учитывает запрос к базе; если обёртка подключена к соединению
+    несколько раз (одновременные запросы в общем потоке ASGI), запрос
+    учитывается однажды."""
+    timing = current_timing.get()
+    if timing is None or timing.querying:
+        return execute(sql, params, many, context)
+    timing.querying = True
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.querying = False
+        timing.record_query(sql, perf_counter() - start)
+
+
+def timed_queries():
+    """Подключает учёт запросов к соединениям текущего потока со всеми
+    базами; закрытие возвращённого ExitStack снимает обёртки."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(record_query))
+    return stack
+
+
+class RequestTimingMiddleware:
+    """Собирает показатели запроса; подключается первым в MIDDLEWARE,
+    чтобы учитывать работу остальных промежуточных слоёв. Работает и в
+    синхронном, и в асинхронном стеке обработчиков."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        instrument_serializers()
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timing = self.start(request)
+        try:
+            with timed_queries():
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(timing.token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = self.start(request)
+        try:
+            # Синхронные представления и промежуточные слои под ASGI
+            # выполняются в общем потоке: обёртка подключается к его
+            # соединениям.
+            queries = await sync_to_async(timed_queries)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(queries.close)()
+        finally:
+            current_timing.reset(timing.token)
+        return self.finish(request, response, timing)
+
+    def start(self, request):
+        timing = RequestTiming()
+        timing.token = current_timing.set(timing)
+        request.timing = timing
+        return timing
+
+    def finish(self, request, response, timing):
+        now = perf_counter()
+        timing.total = now - timing.start
+        if timing.view_start is not None:
+            timing.view = now - timing.view_start
+        if settings.REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = timing.server_timing()
+        self.log(request, response, timing)
+        if settings.METRICS_ENABLED:
+            metrics.observe_request(request, response, timing)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = request.timing
+        timing.view_start = perf_counter()
+        name, actions = view_action(view_func)
+        if actions is None:
+            timing.action = name
+        else:
+            timing.action = f'{name}.{actions.get(request.method.lower())}'
+
+    def log(self, request, response, timing):
+        slow = timing.total * 1000 >= settings.REQUEST_TIMING_SLOW_MS and (
+            random.random() < settings.REQUEST_TIMING_SLOW_SAMPLE_RATE
+        )
+        level = logging.WARNING if slow else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **timing.as_dict(),
+        }
+        if slow:
+            record['sql'] = [
+                {'sql': sql, 'ms': round(duration * 1000, 1)}
+                for sql, duration in timing.statements
+            ]
+        logger.log(level, json.dumps(record, ensure_ascii=False))
+
+
+def pin_key(request):
+    """Ключ кэша для закрепления клиента API, который не хранит cookie."""
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return f'db-pin:{digest}'
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтения безопасных запросов в реплику базы.
+
+    После успешного изменяющего запроса клиент на
+    DATABASE_REPLICA_PIN_SECONDS закрепляется за основной базой и видит
+    свои изменения, даже если реплика отстаёт. Отметка хранится в cookie
+    и в кэше по заголовку Authorization; при нескольких воркерах кэш
+    должен быть общим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        tokens = self.start(self.replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            self.finish(tokens)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        replica = await sync_to_async(self.replica, thread_sensitive=False)(
+            request
+        )
+        tokens = self.start(replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.finish(tokens)
+        await sync_to_async(self.pin, thread_sensitive=False)(
+            request, response
+        )
+        return response
+
+    def start(self, replica):
+        return read_alias.set(replica), checked_connections.set(set())
+
+    def finish(self, tokens):
+        alias_token, checked_token = tokens
+        read_alias.reset(alias_token)
+        checked_connections.reset(checked_token)
+
+    def replica(self, request):
+        if not settings.DATABASE_REPLICAS or (
+            request.method not in SAFE_METHODS
+        ):
+            return None
+        if settings.DATABASE_PIN_COOKIE in request.COOKIES:
+            return None
+        key = pin_key(request)
+        if key is not None and cache.get(key):
+            return None
+        return choose_replica()
+
+    def pin(self, request, response):
+        window = settings.DATABASE_REPLICA_PIN_SECONDS
+        if not settings.DATABASE_REPLICAS or not window or (
+            request.method in SAFE_METHODS or response.status_code >= 400
+        ):
+            return
+        response.set_cookie(
+            settings.DATABASE_PIN_COOKIE, '1',
+            max_age=window, httponly=True, samesite='Lax',
+        )
+        key = pin_key(request)
+        if key is not None:
+            cache.set(key, True, window)
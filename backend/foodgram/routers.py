@@ -0,0 +1,92 @@
+"""Маршрутизация запросов к основной базе и репликам для чтения.
+
+Все записи идут в основную базу default. Чтения идут в реплику, если её
+выбрал для текущего запроса ReplicaRoutingMiddleware: это безопасные
+запросы API от клиентов, которые недавно ничего не изменяли. Внутри
+транзакции основной базы чтения остаются в ней, чтобы видеть ещё не
+зафиксированные изменения.
+
+Постоянные соединения (CONN_MAX_AGE) с CONN_HEALTH_CHECKS проверяются
+один раз за запрос перед первым использованием: неотвечающее соединение
+закрывается и открывается заново. Реплика, к которой не удалось
+подключиться, исключается из выбора на DATABASE_REPLICA_RETRY_SECONDS,
+а чтения на это время возвращаются в основную базу.
+"""
+import random
+from contextvars import ContextVar
+from time import monotonic
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Реплика, из которой читает текущий запрос; None - основная база.
+read_alias = ContextVar('read_alias', default=None)
+# Соединения, уже проверенные в текущем запросе; None - вне запроса.
+checked_connections = ContextVar('checked_connections', default=None)
+# Недоступные реплики и время следующей попытки подключения.
+unavailable = {}
+
+
+def check_connection(alias):
+    """Возвращает соединение alias, закрыв его, если оно перестало
+    отвечать. Проверка выполняется один раз за запрос для каждого
+    соединения (у каждого потока они свои)."""
+    connection = connections[alias]
+    checked = checked_connections.get()
+    if checked is None or connection in checked:
+        return connection
+    checked.add(connection)
+    if (
+        connection.connection is not None
+        and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+        and not connection.in_atomic_block
+        and not connection.is_usable()
+    ):
+        connection.close()
+    return connection
+
+
+def replica_available(alias):
+    if unavailable.get(alias, 0) > monotonic():
+        return False
+    try:
+        check_connection(alias).ensure_connection()
+    except DatabaseError:
+        unavailable[alias] = (
+            monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+        )
+        return False
+    unavailable.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    """Случайная реплика из доступных или None."""
+    now = monotonic()
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS
+        if unavailable.get(alias, 0) <= now
+    ]
+    return random.choice(replicas) if replicas else None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if (
+            alias is None
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or not replica_available(alias)
+        ):
+            return self.db_for_write(model, **hints)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        check_connection(DEFAULT_DB_ALIAS)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
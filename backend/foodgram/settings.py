@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.RequestTimingMiddleware',
+    'foodgram.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,12 +100,47 @@ DATABASES = {
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+    }
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS="replica1 replica2:5433", см.
+# foodgram.routers. В тестах реплики читают тестовую базу default.
+for number, address in enumerate(os.getenv('DB_REPLICA_HOSTS', '').split()):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number + 1}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_REPLICA_CONN_MAX_AGE', DATABASES['default']['CONN_MAX_AGE']
+        )),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['foodgram.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+DATABASE_REPLICA_RETRY_SECONDS = 30
+DATABASE_PIN_COOKIE = 'db_pin'
+
+
+# Общий для всех воркеров и команд кэш в Redis: версии пространств кэша,
+# блокировки перестроения ответов и накопленные счётчики рецептов должны
+# быть видны всем процессам.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django_redis.cache.RedisCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://redis:6379/0'),
     }
 }
 
@@ -194,4 +231,81 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LENGTH_NAME = 10
 
+INGREDIENTS_SEARCH_MIN_LENGTH = int(
+    os.getenv('INGREDIENTS_SEARCH_MIN_LENGTH', 2)
+)
+INGREDIENTS_SEARCH_LIMIT = int(os.getenv('INGREDIENTS_SEARCH_LIMIT', 50))
+INGREDIENTS_SEARCH_CACHE_TIMEOUT = 60 * 60
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 60 * 60))
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 5 * 60))
+RECIPES_CACHE_STALE_TIMEOUT = int(os.getenv('RECIPES_CACHE_STALE_TIMEOUT', 30))
+RECIPES_CACHE_LOCK_TIMEOUT = 10
+
+RECIPE_COUNTERS_FLUSH_INTERVAL = int(
+    os.getenv('RECIPE_COUNTERS_FLUSH_INTERVAL', 0)
+)
+
+RECIPE_IMAGE_SIZES = {
+    'small': 320,
+    'medium': 640,
+    'large': 1280,
+}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', 8000)
+)
+# Изображение в base64 и остальные поля рецепта.
+RECIPE_UPLOAD_MAX_BODY = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
+RECIPES_IMPORT_CHUNK_SIZE = 500
+RECIPES_IMPORT_MAX_ITEMS = int(os.getenv('RECIPES_IMPORT_MAX_ITEMS', 1000))
+# Все рецепты импорта с изображениями в base64; как client_max_body_size
+# в infra/nginx.conf.
+RECIPES_IMPORT_MAX_BODY = int(
+    os.getenv('RECIPES_IMPORT_MAX_BODY', 20 * 1024 * 1024)
+)
+
+RECIPES_BULK_MAX_ITEMS = int(os.getenv('RECIPES_BULK_MAX_ITEMS', 500))
+
+SHOPPING_LIST_CHUNK_SIZE = 500
+SHOPPING_LIST_SPOOL_MAX_MEMORY = 1024 * 1024
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', '1') == '1'
+REQUEST_TIMING_HEADER = os.getenv('REQUEST_TIMING_HEADER', '1') == '1'
+REQUEST_TIMING_SLOW_MS = int(os.getenv('REQUEST_TIMING_SLOW_MS', 500))
+REQUEST_TIMING_SLOW_SAMPLE_RATE = float(
+    os.getenv('REQUEST_TIMING_SLOW_SAMPLE_RATE', 1)
+)
+REQUEST_TIMING_MAX_QUERIES = 100
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+# Асинхронные представления для запуска под ASGI, см. foodgram.async_views.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_USER_MODEL = 'users.User'
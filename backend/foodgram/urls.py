@@ -5,6 +5,8 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 
+from foodgram.async_views import async_urls
+from foodgram.metrics import metrics
 from recipes.views import IngredientsViewSet, TagsViewSet, RecipesViewSet
 from users.views import CustomUserViewSet
 
@@ -12,15 +14,22 @@ router = DefaultRouter()
 
 router.register('ingredients', IngredientsViewSet)
 router.register('recipes', RecipesViewSet)
-router.register('tags', TagsViewSet)
+router.register('tags', TagsViewSet, basename='tags')
 router.register('users', CustomUserViewSet, basename='users')
 
+api_urls = router.urls
+if settings.ASYNC_VIEWS:
+    api_urls = async_urls(api_urls)
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include(router.urls)),
+    path('api/', include(api_urls)),
     path('api/auth/', include('djoser.urls.authtoken'))
 ]
 
+if settings.METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics))
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
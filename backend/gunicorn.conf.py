@@ -0,0 +1,33 @@
+"""Настройки gunicorn.
+
+Gunicorn читает файл из рабочего каталога автоматически. При
+ASYNC_VIEWS=1 проект запускается как приложение ASGI в воркерах uvicorn,
+и нагруженные представления чтения работают асинхронно (см.
+foodgram.async_views); иначе - как приложение WSGI в синхронных
+воркерах.
+
+Если задан PROMETHEUS_MULTIPROC_DIR, каталог метрик очищается при
+запуске, а файлы завершившихся воркеров помечаются для prometheus_client.
+"""
+import os
+import shutil
+
+METRICS_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+if os.environ.get('ASYNC_VIEWS', '0') == '1':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+
+def on_starting(server):
+    if METRICS_DIR:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        os.makedirs(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    if METRICS_DIR:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,10 +1,13 @@
 from django.contrib import admin
+from django.db import transaction
 
+from recipes import cart_totals, counters
 from recipes.models import (
     Favourite,
     Ingredients,
     IngredientsInRecipe,
     Shopping_cart,
+    ShoppingCartTotal,
     Tag,
     TagsInRecipe,
     Recipes,
@@ -35,21 +38,56 @@ class RecipeTagsInLine(admin.TabularInline):
 
 @admin.register(Recipes)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'in_favourites')
-    readonly_fields = ('in_favourites',)
+    list_display = (
+        'id', 'name', 'author', 'in_favourites', 'in_shopping_cart'
+    )
+    list_select_related = ('author',)
+    readonly_fields = ('in_favourites', 'in_shopping_cart')
     list_filter = ('name', 'author',)
     inlines = (RecipeIngredientsInLine, RecipeTagsInLine)
 
-    @admin.display(description='Количество рецептов в избранном')
+    def save_related(self, request, form, formsets, change):
+        with cart_totals.tracking_recipes([form.instance.pk]):
+            super().save_related(request, form, formsets, change)
+
+    @admin.display(
+        description='Количество рецептов в избранном',
+        ordering='favourites_count',
+    )
     def in_favourites(self, obj):
-        return obj.favourite.count()
+        return obj.favourites_count
+
+    @admin.display(
+        description='Количество рецептов в списках покупок',
+        ordering='shopping_cart_count',
+    )
+    def in_shopping_cart(self, obj):
+        return obj.shopping_cart_count
 
 
 @admin.register(IngredientsInRecipe)
 class IngredientsInRecipeAdmin(admin.ModelAdmin):
+    """Изменения состава рецептов переносятся в итоги списков покупок."""
     list_display = ('id', 'recipe', 'ingredient', 'amount')
     list_editable = ('recipe', 'ingredient', 'amount')
 
+    def save_model(self, request, obj, form, change):
+        recipe_ids = [obj.recipe_id]
+        if change:
+            recipe_ids.append(form.initial['recipe'])
+        with cart_totals.tracking_recipes(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with cart_totals.tracking_recipes([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipe_ids = queryset.values_list('recipe_id', flat=True)
+        with cart_totals.tracking_recipes(recipe_ids):
+            super().delete_queryset(request, queryset)
+
 
 @admin.register(TagsInRecipe)
 class TagsInRecipeAdmin(admin.ModelAdmin):
@@ -57,13 +95,59 @@ class TagsInRecipeAdmin(admin.ModelAdmin):
     list_editable = ('recipe', 'tag')
 
 
-@admin.register(Favourite)
-class FavouriteAdmin(admin.ModelAdmin):
+class UserListAdmin(admin.ModelAdmin):
+    """Изменения списка обновляют счётчик рецептов так же, как API."""
     list_display = ('id', 'user', 'recipe')
     list_editable = ('user', 'recipe')
+    counter = None
+
+    def added(self, link):
+        counters.on_commit_change(link.recipe_id, self.counter, 1)
+
+    def removed(self, link):
+        counters.on_commit_change(link.recipe_id, self.counter, -1)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = self.model.objects.get(pk=obj.pk)
+            if (old.user_id, old.recipe_id) == (obj.user_id, obj.recipe_id):
+                super().save_model(request, obj, form, change)
+                return
+            self.removed(old)
+        super().save_model(request, obj, form, change)
+        self.added(obj)
+
+    def delete_model(self, request, obj):
+        self.removed(obj)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for link in queryset:
+            self.removed(link)
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(Favourite)
+class FavouriteAdmin(UserListAdmin):
+    counter = counters.FAVOURITES
 
 
 @admin.register(Shopping_cart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+class ShoppingCartAdmin(UserListAdmin):
+    counter = counters.SHOPPING_CART
+
+    def added(self, link):
+        super().added(link)
+        cart_totals.add_recipe(link.user, link.recipe_id)
+
+    def removed(self, link):
+        super().removed(link)
+        cart_totals.remove_recipe(link.user, link.recipe_id)
+
+
+@admin.register(ShoppingCartTotal)
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+    search_fields = ('user__username',)
@@ -0,0 +1,91 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+INGREDIENTS_CACHE = 'ingredients'
+TAGS_CACHE = 'tags'
+RECIPES_CACHE = 'recipes'
+
+
+def author_recipes_cache(author_id):
+    """Пространство кэша рецептов одного автора."""
+    return f'{RECIPES_CACHE}:author:{author_id}'
+
+
+def recipe_cache(recipe_id):
+    """Пространство кэша одного рецепта."""
+    return f'{RECIPES_CACHE}:recipe:{recipe_id}'
+
+
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def _modified_key(namespace):
+    return f'{namespace}:modified'
+
+
+def get_cache_version(namespace):
+    """Текущая версия пространства ключей кэша."""
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        version = 1
+        cache.add(_version_key(namespace), version, timeout=None)
+    return version
+
+
+def bump_cache_version(namespace):
+    """Инвалидирует все ключи пространства, увеличивая его версию, и
+    запоминает время изменения данных."""
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), 2, timeout=None)
+    cache.set(_modified_key(namespace), int(time.time()), timeout=None)
+
+
+def bump_cache_version_on_commit(namespace):
+    """Инвалидирует пространство после фиксации транзакции: читатель, не
+    видящий ещё изменений, не сохранит старые данные под новой версией."""
+    transaction.on_commit(lambda: bump_cache_version(namespace))
+
+
+def bump_recipe_cache(recipe_id, author_id):
+    """Инвалидирует ответы, содержащие рецепт: общую ленту, рецепты
+    автора и страницу рецепта."""
+    for namespace in (
+        RECIPES_CACHE,
+        author_recipes_cache(author_id),
+        recipe_cache(recipe_id),
+    ):
+        bump_cache_version(namespace)
+
+
+def bump_author_cache(author_id, recipe_ids):
+    """Инвалидирует ответы с данными автора: общую ленту, рецепты автора
+    и страницы его рецептов recipe_ids."""
+    for namespace in (
+        RECIPES_CACHE,
+        author_recipes_cache(author_id),
+        *map(recipe_cache, recipe_ids),
+    ):
+        bump_cache_version(namespace)
+
+
+def get_last_modified(namespace):
+    """Время последнего изменения данных пространства в секундах.
+
+    Если отметка потеряна вместе с кэшем, изменением считается текущий
+    момент: клиенты один раз получат данные заново.
+    """
+    modified = cache.get(_modified_key(namespace))
+    if modified is None:
+        modified = int(time.time())
+        cache.add(_modified_key(namespace), modified, timeout=None)
+    return modified
+
+
+def make_cache_key(namespace, *parts):
+    version = get_cache_version(namespace)
+    return ':'.join((namespace, str(version)) + tuple(map(str, parts)))
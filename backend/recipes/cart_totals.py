@@ -0,0 +1,191 @@
+"""Инкрементальное обслуживание итогов списков покупок."""
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import (
+    IngredientsInRecipe,
+    Recipes,
+    Shopping_cart,
+    ShoppingCartTotal,
+)
+from users.models import User
+
+
+def lock_recipes(recipe_ids):
+    """Блокирует строки рецептов до конца транзакции.
+
+    Изменение состава рецепта и добавление его в список покупок или
+    удаление из списка берут блокировку до чтения количеств и состава
+    списков, поэтому выполняются последовательно: каждое видит
+    зафиксированный результат другого. Рецепты блокируются раньше
+    пользователей и по возрастанию id, чтобы не было взаимоблокировок.
+    """
+    list(
+        Recipes.objects.select_for_update().filter(id__in=recipe_ids)
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def recipe_amounts(recipe):
+    return dict(
+        IngredientsInRecipe.objects.filter(recipe=recipe).values_list(
+            'ingredient_id', 'amount'
+        )
+    )
+
+
+@transaction.atomic(savepoint=False)
+def apply_deltas(user_ids, deltas):
+    """Прибавляет к итогам пользователей изменения количеств ингредиентов.
+
+    Строки пользователей блокируются, чтобы параллельные изменения одного
+    списка покупок применялись последовательно. Число запросов не зависит
+    ни от числа пользователей, ни от числа ингредиентов.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    list(
+        User.objects.select_for_update().filter(id__in=user_ids)
+        .order_by('id').values_list('id', flat=True)
+    )
+    existing = {
+        (total.user_id, total.ingredient_id): total
+        for total in ShoppingCartTotal.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            total = existing.get((user_id, ingredient_id))
+            if total is None:
+                if delta > 0:
+                    to_create.append(ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta,
+                    ))
+                continue
+            total.amount += delta
+            if total.amount > 0:
+                to_update.append(total)
+            else:
+                to_delete.append(total.id)
+    if to_delete:
+        ShoppingCartTotal.objects.filter(id__in=to_delete).delete()
+    if to_update:
+        ShoppingCartTotal.objects.bulk_update(to_update, ['amount'])
+    if to_create:
+        ShoppingCartTotal.objects.bulk_create(to_create)
+
+
+@transaction.atomic(savepoint=False)
+def add_recipe(user, recipe):
+    lock_recipes([getattr(recipe, 'pk', recipe)])
+    apply_deltas([user.id], recipe_amounts(recipe))
+
+
+@transaction.atomic(savepoint=False)
+def remove_recipe(user, recipe):
+    lock_recipes([getattr(recipe, 'pk', recipe)])
+    apply_deltas([user.id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipe_amounts(recipe).items()
+    })
+
+
+def recipes_amounts(recipe_ids):
+    """Суммарные количества ингредиентов нескольких рецептов."""
+    return dict(
+        IngredientsInRecipe.objects.filter(recipe_id__in=recipe_ids).values(
+            'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by().values_list(
+            'ingredient_id', 'total'
+        )
+    )
+
+
+@transaction.atomic(savepoint=False)
+def add_recipes(user, recipe_ids):
+    lock_recipes(recipe_ids)
+    apply_deltas([user.id], recipes_amounts(recipe_ids))
+
+
+@transaction.atomic(savepoint=False)
+def remove_recipes(user, recipe_ids):
+    lock_recipes(recipe_ids)
+    apply_deltas([user.id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in recipes_amounts(recipe_ids).items()
+    })
+
+
+@transaction.atomic(savepoint=False)
+def change_recipe(recipe, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в итоги всех пользователей,
+    у которых рецепт в списке покупок. Вызывающий код блокирует рецепт
+    lock_recipes до чтения old_amounts."""
+    user_ids = list(
+        Shopping_cart.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True
+        )
+    )
+    apply_deltas(user_ids, {
+        ingredient_id:
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    })
+
+
+@contextmanager
+def tracking_recipes(recipe_ids):
+    """Переносит в итоги изменения состава рецептов, сделанные внутри
+    блока в обход change_recipe, например в админке."""
+    recipe_ids = set(recipe_ids)
+    with transaction.atomic(savepoint=False):
+        lock_recipes(recipe_ids)
+        old_amounts = {
+            recipe_id: recipe_amounts(recipe_id) for recipe_id in recipe_ids
+        }
+        yield
+        for recipe_id, amounts in old_amounts.items():
+            change_recipe(recipe_id, amounts, recipe_amounts(recipe_id))
+
+
+@transaction.atomic
+def rebuild(user_ids=None, batch_size=5000):
+    """Перестраивает итоги с нуля по спискам покупок."""
+    totals = ShoppingCartTotal.objects.all()
+    carts = IngredientsInRecipe.objects.filter(
+        recipe__shopping_cart__isnull=False
+    )
+    if user_ids is not None:
+        totals = totals.filter(user_id__in=user_ids)
+        carts = carts.filter(recipe__shopping_cart__user_id__in=user_ids)
+    totals.delete()
+    rows = carts.values(
+        'recipe__shopping_cart__user_id', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by().iterator(
+        chunk_size=batch_size
+    )
+    created = 0
+    batch = []
+    for row in rows:
+        batch.append(ShoppingCartTotal(
+            user_id=row['recipe__shopping_cart__user_id'],
+            ingredient_id=row['ingredient_id'],
+            amount=row['total'],
+        ))
+        if len(batch) >= batch_size:
+            ShoppingCartTotal.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    ShoppingCartTotal.objects.bulk_create(batch)
+    return created + len(batch)
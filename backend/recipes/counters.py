@@ -0,0 +1,125 @@
+"""Денормализованные счётчики избранного и списков покупок рецептов.
+
+Изменение счётчика применяется к строке рецепта после фиксации
+транзакции. При RECIPE_COUNTERS_FLUSH_INTERVAL > 0 изменения копятся в
+кэше и записываются в базу не чаще одного раза за интервал на рецепт:
+популярный рецепт не становится точкой конкуренции за блокировку строки.
+Изменения, накопленные после записи, записывает фоновый таймер по
+истечении интервала, даже если новых изменений счётчика не будет.
+Точные значения восстанавливает команда command_recipe_counters.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.cache import bump_cache_version, make_cache_key
+from recipes.models import Favourite, Recipes, Shopping_cart
+
+COUNTERS_CACHE = 'recipe-counters'
+FAVOURITES = 'favourites_count'
+SHOPPING_CART = 'shopping_cart_count'
+
+logger = logging.getLogger(__name__)
+
+_timers = {}
+_timers_lock = threading.Lock()
+
+
+def apply_delta(recipe_id, field, delta):
+    Recipes.objects.filter(pk=recipe_id).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def flush(recipe_id, field, interval):
+    """Записывает накопленное изменение счётчика, если за последний
+    интервал записи не было, и возвращает False, если запись была."""
+    flush_key = make_cache_key(COUNTERS_CACHE, recipe_id, field, 'flushed')
+    if not cache.add(flush_key, 1, timeout=interval):
+        return False
+    pending_key = make_cache_key(COUNTERS_CACHE, recipe_id, field)
+    pending = cache.get(pending_key, 0)
+    if pending:
+        apply_delta(recipe_id, field, pending)
+        cache.decr(pending_key, pending)
+    return True
+
+
+def flush_later(recipe_id, field, interval):
+    """Запускает таймер записи счётчика, если он ещё не запущен."""
+    with _timers_lock:
+        if (recipe_id, field) in _timers:
+            return
+        timer = threading.Timer(
+            interval, flush_in_background, (recipe_id, field, interval)
+        )
+        timer.daemon = True
+        _timers[recipe_id, field] = timer
+    timer.start()
+
+
+def flush_in_background(recipe_id, field, interval):
+    with _timers_lock:
+        _timers.pop((recipe_id, field), None)
+    try:
+        if not flush(recipe_id, field, interval):
+            flush_later(recipe_id, field, interval)
+    except Exception:
+        logger.exception(
+            'Не удалось записать счётчик %s рецепта %s', field, recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def change_counter(recipe_id, field, delta):
+    interval = settings.RECIPE_COUNTERS_FLUSH_INTERVAL
+    if not interval:
+        apply_delta(recipe_id, field, delta)
+        return
+    pending_key = make_cache_key(COUNTERS_CACHE, recipe_id, field)
+    if not cache.add(pending_key, delta, timeout=None):
+        cache.incr(pending_key, delta)
+    if not flush(recipe_id, field, interval):
+        flush_later(recipe_id, field, interval)
+
+
+def on_commit_change(recipe_id, field, delta):
+    transaction.on_commit(lambda: change_counter(recipe_id, field, delta))
+
+
+def change_counters(recipe_ids, field, delta):
+    """Меняет счётчик сразу у нескольких рецептов: одним UPDATE без
+    накопления или через кэш по каждому рецепту."""
+    if settings.RECIPE_COUNTERS_FLUSH_INTERVAL:
+        for recipe_id in recipe_ids:
+            change_counter(recipe_id, field, delta)
+        return
+    Recipes.objects.filter(pk__in=recipe_ids).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def on_commit_change_many(recipe_ids, field, delta):
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: change_counters(recipe_ids, field, delta))
+
+
+def recount():
+    """Пересчитывает счётчики всех рецептов одним UPDATE."""
+    counters = {}
+    for field, model in ((FAVOURITES, Favourite),
+                         (SHOPPING_CART, Shopping_cart)):
+        counters[field] = Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('id')).values('total')
+        ), Value(0))
+    updated = Recipes.objects.update(**counters)
+    bump_cache_version(COUNTERS_CACHE)
+    return updated
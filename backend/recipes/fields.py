@@ -0,0 +1,165 @@
+import binascii
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+BASE64_MARKER = ';base64,'
+BASE64_WHITESPACE = str.maketrans('', '', ' \t\r\n')
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Изображение в base64, декодируемое пачками во временный файл.
+
+    Размер проверяется по длине строки до декодирования, формат и
+    размеры в пикселях - по заголовку из начала файла. Декодированный
+    файл не держится в памяти целиком и перемещается в хранилище без
+    копирования; пиксели целиком декодируют только фоновые обработчики
+    изображений.
+    """
+    ALLOWED_FORMATS = {
+        'JPEG': 'jpg',
+        'PNG': 'png',
+        'GIF': 'gif',
+        'WEBP': 'webp',
+    }
+    CHUNK_SIZE = 64 * 1024
+    HEADER_LIMIT = 1024 * 1024
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        start = base64_data.find(BASE64_MARKER)
+        start = 0 if start == -1 else start + len(BASE64_MARKER)
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if (len(base64_data) - start) // 4 * 3 > max_size:
+            raise serializers.ValidationError(
+                f'Размер изображения превышает {max_size} байт.'
+            )
+        upload = TemporaryUploadedFile(
+            name='image', content_type=None, size=0, charset=None
+        )
+        try:
+            upload.size = self.decode(base64_data, start, upload)
+        except Exception:
+            upload.close()
+            raise
+        upload.seek(0)
+        return serializers.ImageField.to_internal_value(self, upload)
+
+    def decode(self, base64_data, start, upload):
+        """Пишет декодированные пачки в upload и возвращает их размер.
+
+        Заголовок проверяется, как только его удаётся разобрать; начало
+        файла копится в памяти не дольше HEADER_LIMIT байт.
+        """
+        remainder = ''
+        head = b''
+        checked = False
+        written = 0
+        for offset in range(start, len(base64_data), self.CHUNK_SIZE):
+            chunk = remainder + base64_data[
+                offset:offset + self.CHUNK_SIZE
+            ].translate(BASE64_WHITESPACE)
+            complete = len(chunk) // 4 * 4
+            chunk, remainder = chunk[:complete], chunk[complete:]
+            try:
+                decoded = binascii.a2b_base64(chunk)
+            except (binascii.Error, ValueError):
+                raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+            if not checked:
+                head += decoded
+                last = offset + self.CHUNK_SIZE >= len(base64_data)
+                checked = self.check_header(
+                    head, upload, final=last or len(head) >= self.HEADER_LIMIT
+                )
+                if checked:
+                    head = b''
+            upload.write(decoded)
+            written += len(decoded)
+        if remainder or not checked:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        return written
+
+    def check_header(self, head, upload, final):
+        """Проверяет формат и размеры по началу файла и задаёт имя
+        загрузки. Возвращает False, если заголовок ещё не получен."""
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        too_large = serializers.ValidationError(
+            f'Изображение больше {max_dimension} пикселей по стороне.'
+        )
+        try:
+            image = Image.open(BytesIO(head))
+        except Image.DecompressionBombError:
+            # Размеры из заголовка больше предела Pillow MAX_IMAGE_PIXELS.
+            raise too_large
+        except OSError:
+            # Заголовок обрезан или формат ещё не распознан.
+            if final:
+                raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+            return False
+        extension = self.ALLOWED_FORMATS.get(image.format)
+        if extension is None:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        if max(image.size) > max_dimension:
+            raise too_large
+        upload.name = f'{self.get_file_name(head)}.{extension}'
+        return True
+
+
+class PrimaryKeysField(serializers.ListField):
+    """Список первичных ключей, разрешаемый одним запросом IN вместо
+    запроса на каждый элемент, как у PrimaryKeyRelatedField(many=True).
+    Возвращает объекты в порядке ключей."""
+    default_error_messages = {
+        'does_not_exist': 'Недопустимый первичный ключ "{pk_value}" - '
+                          'объект не существует.',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs['child'] = serializers.IntegerField()
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        objects = self.queryset.in_bulk(ids)
+        for pk in ids:
+            if pk not in objects:
+                self.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in ids]
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта по размерам и
+    форматам. Пока копии не построены, возвращается пустой словарь и
+    клиент использует оригинал из поля image."""
+
+    def __init__(self, sizes=None, **kwargs):
+        self.sizes = sizes
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        variants = recipe.image_variants
+        if not recipe.image or variants.get('source') != recipe.image.name:
+            return {}
+        request = self.context.get('request')
+        representation = {}
+        for size, formats in variants['sizes'].items():
+            if self.sizes is not None and size not in self.sizes:
+                continue
+            representation[size] = {}
+            for image_format, name in formats.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                representation[size][image_format] = url
+        return representation
@@ -1,12 +1,89 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
-from recipes.models import Recipes, Tag
+from recipes.models import Recipes, Tag, TagsInRecipe, normalize_name
+
+
+class IngredientsSearchFilter(BaseFilterBackend):
+    """Поиск ингредиентов по началу названия без учёта регистра.
+
+    Сравнение идёт с нормализованным индексированным полем search_name,
+    поэтому запрос использует индекс, а не UPPER(name) LIKE.
+    """
+    search_param = 'name'
+
+    def get_prefix(self, request):
+        return normalize_name(request.query_params.get(self.search_param, ''))
+
+    def filter_queryset(self, request, queryset, view):
+        prefix = self.get_prefix(request)
+        if not prefix:
+            return queryset
+        if len(prefix) < settings.INGREDIENTS_SEARCH_MIN_LENGTH:
+            return queryset.none()
+        return queryset.filter(
+            search_name__startswith=prefix
+        ).order_by('search_name')
+
+
+class RecipesSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск рецептов по названию и описанию.
+
+    На PostgreSQL запрос разбирается в русской и английской конфигурациях,
+    сравнивается с индексированным search_vector, а результаты
+    упорядочиваются по релевантности. На остальных СУБД поиск, как и
+    прежде, идёт по вхождению строки в название.
+    """
+    search_configs = ('russian', 'english')
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor != 'postgresql':
+            return queryset.filter(name__icontains=value)
+        query = SearchQuery(
+            value, config=self.search_configs[0], search_type='websearch'
+        )
+        for config in self.search_configs[1:]:
+            query |= SearchQuery(value, config=config, search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-id')
+
+
+class RecipesOrderingFilter(BaseFilterBackend):
+    """Сортировка выдачи рецептов; ordering=popular упорядочивает по
+    денормализованным счётчикам избранного и списков покупок."""
+    ordering_param = 'ordering'
+    orderings = {
+        'popular': ('-favourites_count', '-shopping_cart_count', '-id'),
+    }
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.orderings.get(
+            request.query_params.get(self.ordering_param)
+        )
+        if ordering is None:
+            return queryset
+        return queryset.order_by(*ordering)
 
 
 class RecipesFilter(FilterSet):
+    TAGS_MATCH_CHOICES = (('any', 'Любой из тегов'), ('all', 'Все теги'))
+
     tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
                                              to_field_name='slug',
-                                             queryset=Tag.objects.all())
+                                             queryset=Tag.objects.all(),
+                                             method='tags_filter')
+    tags_match = filters.ChoiceFilter(choices=TAGS_MATCH_CHOICES,
+                                      method='tags_match_filter')
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
@@ -16,6 +93,25 @@ class RecipesFilter(FilterSet):
         model = Recipes
         fields = ('tags', 'author',)
 
+    def tags_filter(self, queryset, name, value):
+        """Отбирает рецепты полусоединением EXISTS по TagsInRecipe вместо
+        JOIN: строки не размножаются, DISTINCT и дорогой COUNT не нужны."""
+        tag_ids = [tag.id for tag in value]
+        if not tag_ids:
+            return queryset
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(TagsInRecipe.objects.filter(
+                    recipe=OuterRef('pk'), tag_id=tag_id
+                )))
+            return queryset
+        return queryset.filter(Exists(TagsInRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=tag_ids
+        )))
+
+    def tags_match_filter(self, queryset, name, value):
+        return queryset
+
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
@@ -0,0 +1,135 @@
+"""Уменьшенные копии изображений рецептов.
+
+Запрос на создание или изменение рецепта только сохраняет оригинал.
+После фиксации транзакции изображение передаётся в пул фоновых потоков,
+который строит копии размеров RECIPE_IMAGE_SIZES в форматах
+RECIPE_IMAGE_FORMATS и записывает их пути в Recipes.image_variants.
+При RECIPE_IMAGE_WORKERS = 0 копии строятся сразу после фиксации.
+Необработанные изображения досоздаёт команда command_image_variants.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.cache import bump_recipe_cache
+from recipes.models import Recipes
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_PATH = 'recipes/variants'
+SAVE_OPTIONS = {
+    'webp': {'method': 4},
+    'jpeg': {'optimize': True, 'progressive': True},
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def render_variant(image, size, image_format):
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if image_format == 'jpeg' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    output = BytesIO()
+    variant.save(
+        output,
+        format=image_format,
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        **SAVE_OPTIONS.get(image_format, {}),
+    )
+    return output.getvalue()
+
+
+def delete_variants(variants):
+    for formats in variants.get('sizes', {}).values():
+        for name in formats.values():
+            default_storage.delete(name)
+
+
+def build_variants(recipe_id):
+    """Строит копии изображения рецепта и сохраняет их пути.
+
+    Пути записываются, только если изображение не сменилось за время
+    обработки; иначе копии удаляются, их построит следующая задача.
+    """
+    recipe = Recipes.objects.only(
+        'id', 'author_id', 'image', 'image_variants'
+    ).filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return None
+    source = recipe.image.name
+    with recipe.image.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    stem = os.path.splitext(os.path.basename(source))[0]
+    sizes = {}
+    for size_name, size in settings.RECIPE_IMAGE_SIZES.items():
+        sizes[size_name] = {
+            image_format: default_storage.save(
+                f'{VARIANTS_PATH}/{recipe_id}/{stem}-{size_name}.'
+                f'{image_format}',
+                ContentFile(render_variant(image, size, image_format)),
+            )
+            for image_format in settings.RECIPE_IMAGE_FORMATS
+        }
+    variants = {'source': source, 'sizes': sizes}
+    updated = Recipes.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants
+    )
+    if not updated:
+        delete_variants(variants)
+        return None
+    delete_variants(recipe.image_variants)
+    bump_recipe_cache(recipe_id, recipe.author_id)
+    return variants
+
+
+def process(recipe_id):
+    """Строит копии, не прерывая вызывающий код при ошибке: исходное
+    изображение сохранено, копии досоздаст command_image_variants."""
+    try:
+        build_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось построить копии изображения рецепта %s', recipe_id
+        )
+
+
+def process_in_background(recipe_id):
+    try:
+        process(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(recipe_id):
+    """Ставит построение копий в очередь после фиксации транзакции."""
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(process_in_background, recipe_id)
+        )
+    else:
+        transaction.on_commit(lambda: process(recipe_id))
+
+
+def needs_processing(recipe):
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') != recipe.image.name
+    )
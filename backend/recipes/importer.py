@@ -0,0 +1,150 @@
+"""Массовый импорт рецептов.
+
+Ссылки на теги и ингредиенты всех рецептов загружаются одним запросом
+на модель. Рецепты и их связи вставляются пачками bulk_create в одной
+транзакции, а результат сообщается по каждому рецепту отдельно:
+ошибочные рецепты пропускаются, не мешая остальным.
+"""
+import json
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from recipes import images
+from recipes.cache import (
+    RECIPES_CACHE,
+    author_recipes_cache,
+    bump_cache_version,
+)
+from recipes.models import (
+    Ingredients,
+    IngredientsInRecipe,
+    Recipes,
+    Tag,
+    TagsInRecipe,
+)
+from recipes.serializers import RecipeImportSerializer
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse_items(text):
+    """Разбирает JSON-массив или NDJSON, по одному рецепту в строке."""
+    text = text.strip()
+    if text.startswith('['):
+        try:
+            items = json.loads(text)
+        except ValueError as error:
+            raise ImportFormatError(f'Некорректный JSON: {error}')
+        return items
+    items = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as error:
+            raise ImportFormatError(f'Строка {number}: {error}')
+    return items
+
+
+def referenced_ids(items, field, key=None):
+    ids = set()
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get(field), list):
+            continue
+        for value in item[field]:
+            if key is not None:
+                value = value.get(key) if isinstance(value, dict) else None
+            if isinstance(value, int):
+                ids.add(value)
+    return ids
+
+
+def validate_items(items):
+    context = {
+        'tag_ids': set(Tag.objects.filter(
+            id__in=referenced_ids(items, 'tags')
+        ).values_list('id', flat=True)),
+        'ingredient_ids': set(Ingredients.objects.filter(
+            id__in=referenced_ids(items, 'ingredients', 'id')
+        ).values_list('id', flat=True)),
+    }
+    report = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = RecipeImportSerializer(data=item, context=context)
+        if serializer.is_valid():
+            report.append({'index': index})
+            valid.append((report[-1], serializer.validated_data))
+        else:
+            report.append({'index': index, 'errors': serializer.errors})
+    return report, valid
+
+
+def insert_recipes(recipes, author):
+    """Вставляет рецепты и проставляет им первичные ключи. Если СУБД не
+    возвращает ключи из bulk_create, они читаются после вставки."""
+    chunk_size = settings.RECIPES_IMPORT_CHUNK_SIZE
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipes.objects.bulk_create(recipes, batch_size=chunk_size)
+        return
+    last_id = Recipes.objects.aggregate(Max('id'))['id__max'] or 0
+    Recipes.objects.bulk_create(recipes, batch_size=chunk_size)
+    created = Recipes.objects.filter(
+        author=author, id__gt=last_id
+    ).order_by('id').values_list('id', flat=True)
+    for recipe, recipe_id in zip(recipes, created):
+        recipe.pk = recipe_id
+
+
+def invalidate_cache(author):
+    bump_cache_version(RECIPES_CACHE)
+    bump_cache_version(author_recipes_cache(author.pk))
+
+
+def import_recipes(items, author):
+    """Импортирует рецепты автора и возвращает отчёт по каждому из них."""
+    report, valid = validate_items(items)
+    if not valid:
+        return report
+    chunk_size = settings.RECIPES_IMPORT_CHUNK_SIZE
+    recipes = [
+        Recipes(
+            author=author,
+            **{
+                field: value for field, value in data.items()
+                if field not in ('tags', 'ingredients')
+            },
+        )
+        for _, data in valid
+    ]
+    try:
+        with transaction.atomic():
+            insert_recipes(recipes, author)
+            TagsInRecipe.objects.bulk_create([
+                TagsInRecipe(recipe=recipe, tag_id=tag_id)
+                for recipe, (_, data) in zip(recipes, valid)
+                for tag_id in data['tags']
+            ], batch_size=chunk_size)
+            IngredientsInRecipe.objects.bulk_create([
+                IngredientsInRecipe(
+                    recipe=recipe,
+                    ingredient_id=ingredient['id'],
+                    amount=ingredient['amount'],
+                )
+                for recipe, (_, data) in zip(recipes, valid)
+                for ingredient in data['ingredients']
+            ], batch_size=chunk_size)
+            for recipe in recipes:
+                images.schedule(recipe.pk)
+            transaction.on_commit(lambda: invalidate_cache(author))
+    finally:
+        for _, data in valid:
+            data['image'].close()
+    for recipe, (entry, _) in zip(recipes, valid):
+        entry['id'] = recipe.pk
+    return report
@@ -0,0 +1,162 @@
+import os
+import socket
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from time import perf_counter, sleep
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/tags/',
+    f'/api/ingredients/?name={quote("са")}',
+)
+# Режимы запуска gunicorn для --compare, см. gunicorn.conf.py.
+SERVERS = (
+    ('sync', {'ASYNC_VIEWS': '0'}),
+    ('async', {'ASYNC_VIEWS': '1'}),
+)
+START_TIMEOUT = 30
+
+
+def fetch(url, headers):
+    """Время ответа в секундах и признак успешного ответа."""
+    start = perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers), timeout=60) as response:
+            response.read()
+            ok = response.status < 400
+    except OSError:
+        ok = False
+    return perf_counter() - start, ok
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the read API endpoints with concurrent requests and report '
+        'throughput and latency percentiles; with --compare start gunicorn '
+        'in the sync and async (ASGI) modes in turn and compare them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of a running server.',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='API path to request, may be repeated.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=64,
+            help='Number of simultaneous requests.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Total number of requests per run.',
+        )
+        parser.add_argument(
+            '--token',
+            help='Auth token to send with the requests.',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Start gunicorn in sync and async modes and load each.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Gunicorn workers for --compare.',
+        )
+
+    def handle(self, *args, **options):
+        self.paths = options['paths'] or DEFAULT_PATHS
+        self.concurrency = options['concurrency']
+        self.total = options['requests']
+        self.headers = {}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        if not options['compare']:
+            self.report(options['url'], self.load(options['url']))
+            return
+        for name, env in SERVERS:
+            url = f'http://127.0.0.1:{free_port()}'
+            server = self.start_server(url, env, options['workers'])
+            try:
+                self.wait(url, server)
+                self.report(name, self.load(url))
+            finally:
+                server.terminate()
+                server.wait()
+
+    def load(self, url):
+        """Выполняет запросы в self.concurrency потоков и возвращает
+        время ответов, число ошибок и продолжительность прогона."""
+        urls = islice(cycle(url + path for path in self.paths), self.total)
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            start = perf_counter()
+            results = list(executor.map(
+                lambda target: fetch(target, self.headers), urls
+            ))
+            elapsed = perf_counter() - start
+        durations = sorted(duration for duration, _ in results)
+        errors = sum(not ok for _, ok in results)
+        return durations, errors, elapsed
+
+    def report(self, name, result):
+        durations, errors, elapsed = result
+        latency = ', '.join(
+            f'{label} {percentile(durations, share) * 1000:.1f} мс'
+            for label, share in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+        )
+        self.stdout.write(
+            f'{name}: {len(durations) / elapsed:.1f} запросов/с, {latency}, '
+            f'ошибок {errors} из {len(durations)}'
+        )
+
+    def start_server(self, url, env, workers):
+        return subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn',
+                '--bind', url.removeprefix('http://'),
+                '--workers', str(workers),
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, **env},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def wait(self, url, server):
+        deadline = perf_counter() + START_TIMEOUT
+        while perf_counter() < deadline:
+            if server.poll() is not None:
+                raise CommandError('Gunicorn завершился при запуске.')
+            if fetch(url + self.paths[0], self.headers)[1]:
+                return
+            sleep(0.2)
+        raise CommandError(f'Сервер {url} не ответил за {START_TIMEOUT} с.')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cart_totals import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild shopping cart totals from shopping carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Rebuild totals only for the given user id.',
+        )
+
+    def handle(self, *args, **options):
+        created = rebuild(options['users'])
+        self.stdout.write(f'Итоги списков покупок пересчитаны: {created}.')
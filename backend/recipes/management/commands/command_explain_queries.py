@@ -0,0 +1,343 @@
+import json
+import re
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favourite, Ingredients, Recipes, Tag
+from users.models import User
+
+# Действия вьюсетов и запросы, которыми они вызываются. Изменяющие
+# действия выполняются в транзакции, которая затем откатывается.
+CANONICAL_REQUESTS = (
+    ('recipes.list', 'get', '/api/recipes/'),
+    ('recipes.list author', 'get', '/api/recipes/?author={author}'),
+    ('recipes.list tags', 'get', '/api/recipes/?tags={tag}'),
+    ('recipes.list is_favorited', 'get', '/api/recipes/?is_favorited=1'),
+    ('recipes.list is_in_shopping_cart', 'get',
+     '/api/recipes/?is_in_shopping_cart=1'),
+    ('recipes.list popular', 'get', '/api/recipes/?ordering=popular'),
+    ('recipes.list search', 'get', '/api/recipes/?name={word}'),
+    ('recipes.retrieve', 'get', '/api/recipes/{recipe}/'),
+    ('recipes.favorite', 'post', '/api/recipes/{recipe}/favorite/'),
+    ('recipes.shopping_cart', 'post', '/api/recipes/{recipe}/shopping_cart/'),
+    ('recipes.download_shopping_cart', 'get',
+     '/api/recipes/download_shopping_cart/'),
+    ('recipes.shopping_cart_summary', 'get',
+     '/api/recipes/shopping_cart_summary/'),
+    ('users.list', 'get', '/api/users/'),
+    ('users.retrieve', 'get', '/api/users/{author}/'),
+    ('users.subscriptions', 'get',
+     '/api/users/subscriptions/?recipes_limit=3'),
+    ('users.subscribe', 'post', '/api/users/{author}/subscribe/'),
+    ('ingredients.list', 'get', '/api/ingredients/?name={prefix}'),
+    ('tags.list', 'get', '/api/tags/'),
+)
+STATEMENTS = ('select', 'insert', 'update', 'delete', 'with')
+# Левая часть сравнения в условии узла плана PostgreSQL.
+CONDITION_COLUMN = re.compile(
+    r'(?:\w+\.)?"?(\w+)"?\)*(?:::\w+)? (?:=|<>|<=|>=|<|>|~~|~>=~|~<~|@@) '
+)
+SORT_COLUMN = re.compile(r'^(?:\w+\.)?"?(\w+)"?( DESC)?')
+# Запросы .iterator() на PostgreSQL выполняются серверным курсором.
+DECLARE_CURSOR = re.compile(
+    r'^\s*DECLARE\s+\S+\s+(?:.*?\s+)?CURSOR\s+'
+    r'(?:WITH(?:OUT)?\s+HOLD\s+)?FOR\s+',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def cursor_query(sql):
+    """Запрос серверного курсора без DECLARE ... CURSOR FOR."""
+    return DECLARE_CURSOR.sub('', sql, count=1)
+
+
+def plan_nodes(plan, parents=()):
+    yield plan, parents
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child, (*parents, plan))
+
+
+def scan_below(plan):
+    """Первый узел чтения таблицы под узлом плана."""
+    for node, _ in plan_nodes(plan):
+        if 'Relation Name' in node:
+            return node
+    return None
+
+
+def condition_columns(node):
+    columns = []
+    for key in ('Index Cond', 'Recheck Cond', 'Filter', 'Hash Cond'):
+        for column in CONDITION_COLUMN.findall(node.get(key, '')):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def index_statement(table, columns):
+    name = '_'.join([table, *(column.split()[0] for column in columns)])
+    return (
+        f'CREATE INDEX CONCURRENTLY {name[:59]}_idx '
+        f'ON {table} ({", ".join(columns)});'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay the queries behind the API viewset actions, EXPLAIN them '
+        'and report sequential scans, sorts and hash joins over large '
+        'tables with index suggestions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE (PostgreSQL only).',
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=10_000,
+            help='Tables and plan nodes smaller than this are ignored.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Username to replay the requests as.',
+        )
+
+    def handle(self, *args, **options):
+        self.analyze = options['analyze']
+        self.min_rows = options['min_rows']
+        self.table_rows = self.count_rows()
+        user, values = self.sample(options['user'])
+        suggestions = []
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            }},
+        ), transaction.atomic():
+            client = APIClient()
+            client.force_authenticate(user)
+            for name, method, url in CANONICAL_REQUESTS:
+                statements = self.replay(client, method, url.format(**values))
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{name}: запросов к базе - {len(statements)}'
+                ))
+                for sql in statements:
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'  {sql}')
+                    for issue, suggestion in self.explain(sql):
+                        self.stdout.write(f'  {issue}')
+                        if suggestion and suggestion not in suggestions:
+                            suggestions.append(suggestion)
+            transaction.set_rollback(True)
+        if connection.vendor != 'postgresql':
+            self.stdout.write(
+                'Индексы предлагаются только по планам PostgreSQL.'
+            )
+            return
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS(
+                'Все запросы обслуживаются индексами.'
+            ))
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING('Предлагаемые индексы:'))
+        for suggestion in suggestions:
+            self.stdout.write(f'  {suggestion}')
+
+    def sample(self, username):
+        """Пользователь, от имени которого повторяются запросы, и
+        значения параметров запросов из текущей базы."""
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден.')
+        else:
+            user_id = Favourite.objects.order_by('id').values_list(
+                'user_id', flat=True
+            ).first()
+            user = User.objects.filter(id=user_id).first()
+        recipe = Recipes.objects.exclude(author=user).only(
+            'id', 'name', 'author_id'
+        ).first()
+        tag = Tag.objects.exclude(slug=None).first()
+        ingredient = Ingredients.objects.only('search_name').first()
+        if user is None or recipe is None or tag is None or not ingredient:
+            raise CommandError(
+                'Для разбора запросов нужны пользователь с избранным, '
+                'рецепт другого автора, тег и ингредиент.'
+            )
+        return user, {
+            'author': recipe.author_id,
+            'recipe': recipe.id,
+            'tag': quote(tag.slug),
+            'word': quote(recipe.name.split()[0]),
+            'prefix': quote(ingredient.search_name[:3]),
+        }
+
+    def replay(self, client, method, url):
+        """Выполняет запрос к API и возвращает выполненные им запросы к
+        базе данных без повторов."""
+        with CaptureQueriesContext(connection) as context:
+            try:
+                with transaction.atomic():
+                    response = getattr(client, method)(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+            except Exception as error:
+                self.stderr.write(f'{method.upper()} {url}: {error!r}')
+        statements = []
+        for query in context.captured_queries:
+            sql = cursor_query(query['sql'])
+            if sql.lstrip().lower().startswith(STATEMENTS) and (
+                sql not in statements
+            ):
+                statements.append(sql)
+        return statements
+
+    def count_rows(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT relname, reltuples::bigint FROM pg_class "
+                    "WHERE relkind = 'r'"
+                )
+                return dict(cursor.fetchall())
+        rows = {}
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}'
+                )
+                rows[table] = cursor.fetchone()[0]
+        return rows
+
+    def explain(self, sql):
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    return self.explain_postgresql(cursor, sql)
+                return self.explain_sqlite(cursor, sql)
+        except Exception as error:
+            return [(f'EXPLAIN не выполнен: {error}', None)]
+
+    def explain_postgresql(self, cursor, sql):
+        options = 'ANALYZE, BUFFERS, FORMAT JSON' if self.analyze else (
+            'FORMAT JSON'
+        )
+        cursor.execute(f'EXPLAIN ({options}) {sql}')
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        issues = []
+        for node, parents in plan_nodes(plan[0]['Plan']):
+            node_type = node['Node Type']
+            if node_type == 'Seq Scan':
+                issue = self.seq_scan_issue(node, parents)
+            elif node_type == 'Sort':
+                issue = self.sort_issue(node)
+            elif node_type == 'Hash Join':
+                issue = self.hash_join_issue(node)
+            else:
+                issue = None
+            if issue is not None:
+                issues.append(issue)
+        return issues
+
+    def timing(self, node):
+        if 'Actual Total Time' not in node:
+            return ''
+        return f', {node["Actual Total Time"]:.1f} мс'
+
+    def seq_scan_issue(self, node, parents):
+        table = node['Relation Name']
+        rows = self.table_rows.get(table, 0)
+        if rows < self.min_rows:
+            return None
+        columns = condition_columns(node)
+        sort = next(
+            (parent for parent in reversed(parents)
+             if parent['Node Type'] == 'Sort'),
+            None,
+        )
+        if sort is not None:
+            columns += self.sort_columns(sort, node, columns)
+        issue = (
+            f'[seq scan] {table} ({rows} строк{self.timing(node)}): '
+            f'{node.get("Filter", "без условия")}'
+        )
+        return issue, index_statement(table, columns) if columns else None
+
+    def sort_columns(self, sort, scan, exclude=()):
+        alias = scan.get('Alias', scan['Relation Name'])
+        columns = []
+        for key in sort.get('Sort Key', ()):
+            qualifier = key.split('.')[0] if '.' in key else alias
+            match = SORT_COLUMN.match(key)
+            if qualifier == alias and match and match[1] not in exclude:
+                columns.append(match[1] + (match[2] or ''))
+        return columns
+
+    def sort_issue(self, node):
+        rows = node.get('Actual Rows', node['Plan Rows'])
+        scan = scan_below(node)
+        if rows < self.min_rows and (
+            scan is None
+            or self.table_rows.get(scan['Relation Name'], 0) < self.min_rows
+        ):
+            return None
+        issue = (
+            f'[sort] {", ".join(node.get("Sort Key", ()))} '
+            f'({rows} строк{self.timing(node)})'
+        )
+        if scan is None or scan['Node Type'] == 'Seq Scan':
+            # Индекс для такого чтения предложит разбор Seq Scan.
+            return issue, None
+        columns = condition_columns(scan)
+        columns += self.sort_columns(node, scan, columns)
+        return issue, index_statement(scan['Relation Name'], columns)
+
+    def hash_join_issue(self, node):
+        sides = node.get('Plans', ())
+        rows = max(
+            (side.get('Actual Rows', side['Plan Rows']) for side in sides),
+            default=0,
+        )
+        if rows < self.min_rows:
+            return None
+        return (
+            f'[hash join] {node.get("Hash Cond", "")} '
+            f'({rows} строк{self.timing(node)})'
+        ), None
+
+    def explain_sqlite(self, cursor, sql):
+        """SQLite не оценивает число строк узлов, поэтому сортировка
+        отмечается, если запрос читает хотя бы одну большую таблицу."""
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        details = [row[-1] for row in cursor.fetchall()]
+        largest = 0
+        issues = []
+        for detail in details:
+            words = detail.split()
+            if words[0] not in ('SCAN', 'SEARCH') or (
+                words[1] not in self.table_rows
+            ):
+                continue
+            rows = self.table_rows[words[1]]
+            largest = max(largest, rows)
+            if words[0] == 'SCAN' and 'INDEX' not in detail and (
+                rows >= self.min_rows
+            ):
+                issues.append((f'[seq scan] {words[1]} ({rows} строк)', None))
+        if largest >= self.min_rows:
+            issues += [
+                (f'[sort] {detail}', None)
+                for detail in details if 'TEMP B-TREE' in detail
+            ]
+        return issues
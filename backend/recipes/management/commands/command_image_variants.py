@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants, needs_processing
+from recipes.models import Recipes
+
+
+class Command(BaseCommand):
+    help = 'Build resized and WebP variants of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild variants of every recipe, not only pending ones.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipes.objects.only(
+            'id', 'image', 'image_variants'
+        ).order_by('id').iterator(chunk_size=1000)
+        built = failed = 0
+        for recipe in recipes:
+            if not options['all'] and not needs_processing(recipe):
+                continue
+            try:
+                variants = build_variants(recipe.id)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            built += variants is not None
+        self.stdout.write(
+            f'Копии изображений построены: {built}, ошибок: {failed}.'
+        )
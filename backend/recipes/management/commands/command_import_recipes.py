@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importer import ImportFormatError, import_recipes, parse_items
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from a JSON array or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON or NDJSON file with recipes.')
+        parser.add_argument(
+            '--author',
+            required=True,
+            help='Username of the author of imported recipes.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["author"]}.')
+        try:
+            with open(options['path'], encoding='UTF-8') as file:
+                items = parse_items(file.read())
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(error)
+        report = import_recipes(items, author)
+        created = 0
+        for entry in report:
+            if 'id' in entry:
+                created += 1
+            else:
+                self.stderr.write(
+                    f'Рецепт {entry["index"]}: {entry["errors"]}'
+                )
+        self.stdout.write(
+            f'Импортировано рецептов: {created}, '
+            f'с ошибками: {len(report) - created}.'
+        )
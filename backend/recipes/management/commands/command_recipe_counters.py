@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Recount favourite and shopping cart counters of recipes'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Счётчики рецептов пересчитаны: {recount()}.')
@@ -0,0 +1,236 @@
+import csv
+import io
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from recipes.cart_totals import rebuild
+from recipes.counters import recount
+from recipes.models import (
+    Favourite,
+    Ingredients,
+    IngredientsInRecipe,
+    Recipes,
+    Shopping_cart,
+    Tag,
+    TagsInRecipe,
+)
+from users.models import Subscribe, User
+
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Рагу', 'Омлет', 'Каша', 'Запеканка',
+    'Паста', 'Плов', 'Котлеты', 'Блины', 'Гратен', 'Ризотто', 'Бульон',
+)
+STYLES = (
+    'домашний', 'быстрый', 'праздничный', 'летний', 'острый',
+    'постный', 'сытный', 'бабушкин', 'лёгкий', 'пряный',
+)
+EXTRA_TAGS = (
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#BB6BD9', 'bakery'),
+    ('Суп', '#2F80ED', 'soup'),
+    ('Вегетарианское', '#27AE60', 'vegetarian'),
+    ('Быстро', '#EB5757', 'quick'),
+)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def skewed_sample(rng, start, count, k, exclude=None):
+    """Выбирает k различных id из [start, start + count) со смещением к
+    началу диапазона: популярные рецепты и авторы встречаются чаще."""
+    k = min(k, count - (1 if exclude is not None else 0))
+    chosen = set()
+    while len(chosen) < k:
+        value = start + int(count * rng.random() ** 2)
+        if value != exclude:
+            chosen.add(value)
+    return sorted(chosen)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic production-scale dataset: users, '
+        'recipes with ingredients and tags, favourites, shopping carts '
+        'and subscriptions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--recipes', type=int, default=1_000_000)
+        parser.add_argument('--min-ingredients', type=int, default=5)
+        parser.add_argument('--max-ingredients', type=int, default=15)
+        parser.add_argument('--favourites-per-user', type=int, default=30)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int, default=20)
+        parser.add_argument('--chunk-size', type=int, default=10_000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Use bulk_create even on PostgreSQL instead of COPY.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        ingredient_ids = list(
+            Ingredients.objects.order_by('id').values_list('id', flat=True)
+        )
+        if len(ingredient_ids) < options['max_ingredients']:
+            raise CommandError(
+                'Недостаточно ингредиентов, сначала выполните command_csv.'
+            )
+        tag_ids = self.ensure_tags()
+        users_count = options['users']
+        recipes_count = options['recipes']
+        first_user = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        first_recipe = (
+            Recipes.objects.aggregate(Max('id'))['id__max'] or 0
+        ) + 1
+
+        self.write(User, (
+            'id', 'password', 'is_superuser', 'is_staff', 'is_active',
+            'date_joined', 'email', 'username', 'first_name', 'last_name',
+        ), self.user_rows(first_user, users_count))
+        self.write(Recipes, (
+            'id', 'name', 'author_id', 'image', 'image_variants', 'text',
+            'cooking_time', 'favourites_count', 'shopping_cart_count',
+        ), self.recipe_rows(first_recipe, recipes_count, first_user,
+                            users_count))
+        self.reset_sequences()
+        self.write(TagsInRecipe, ('recipe_id', 'tag_id'), (
+            (recipe_id, tag_id)
+            for recipe_id in range(first_recipe, first_recipe + recipes_count)
+            for tag_id in self.rng.sample(
+                tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+            )
+        ))
+        self.write(IngredientsInRecipe, (
+            'recipe_id', 'ingredient_id', 'amount',
+        ), (
+            (recipe_id, ingredient_id, self.rng.randint(1, 500))
+            for recipe_id in range(first_recipe, first_recipe + recipes_count)
+            for ingredient_id in self.rng.sample(
+                ingredient_ids,
+                self.rng.randint(
+                    options['min_ingredients'], options['max_ingredients']
+                ),
+            )
+        ))
+        for model, per_user in (
+            (Favourite, options['favourites_per_user']),
+            (Shopping_cart, options['carts_per_user']),
+        ):
+            self.write(model, ('user_id', 'recipe_id'), (
+                (user_id, recipe_id)
+                for user_id in range(first_user, first_user + users_count)
+                for recipe_id in skewed_sample(
+                    self.rng, first_recipe, recipes_count,
+                    self.rng.randint(0, 2 * per_user),
+                )
+            ))
+        self.write(Subscribe, ('user_id', 'author_id'), (
+            (user_id, author_id)
+            for user_id in range(first_user, first_user + users_count)
+            for author_id in skewed_sample(
+                self.rng, first_user, users_count,
+                self.rng.randint(0, 2 * options['subscriptions_per_user']),
+                exclude=user_id,
+            )
+        ))
+        self.stdout.write(
+            f'Итоги списков покупок пересчитаны: {rebuild()}.'
+        )
+        self.stdout.write(f'Счётчики рецептов пересчитаны: {recount()}.')
+
+    def ensure_tags(self):
+        Tag.objects.bulk_create(
+            [
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in EXTRA_TAGS
+                if not Tag.objects.filter(slug=slug).exists()
+            ]
+        )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def user_rows(self, first_id, count):
+        joined = '2023-01-01 00:00:00+00:00'
+        for user_id in range(first_id, first_id + count):
+            yield (
+                user_id, UNUSABLE_PASSWORD_PREFIX, False, False, True,
+                joined, f'load{user_id}@foodgram.ru', f'load{user_id}',
+                'Пользователь', str(user_id),
+            )
+
+    def recipe_rows(self, first_id, count, first_user, users_count):
+        for recipe_id in range(first_id, first_id + count):
+            dish = self.rng.choice(DISHES)
+            style = self.rng.choice(STYLES)
+            yield (
+                recipe_id,
+                f'{dish} {style} №{recipe_id}',
+                first_user + int(users_count * self.rng.random() ** 2),
+                'recipes/load.png',
+                {},
+                f'{dish} {style}: нарезать, смешать и готовить до '
+                f'готовности.',
+                self.rng.randint(5, 180),
+                0,
+                0,
+            )
+
+    def write(self, model, fields, rows):
+        """Записывает строки пачками: COPY на PostgreSQL, иначе
+        bulk_create."""
+        total = 0
+        for chunk in chunked(rows, self.chunk_size):
+            with transaction.atomic():
+                if self.use_copy:
+                    self.copy(model, fields, chunk)
+                else:
+                    model.objects.bulk_create(
+                        [model(**dict(zip(fields, row))) for row in chunk]
+                    )
+            total += len(chunk)
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: добавлено {total} записей.'
+        )
+
+    def copy(self, model, fields, chunk):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(chunk)
+        buffer.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipes]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    from recipes.models import normalize_name
+
+    Ingredients = apps.get_model('recipes', 'Ingredients')
+    ingredients = list(Ingredients.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.search_name = normalize_name(ingredient.name)
+    Ingredients.objects.bulk_update(
+        ingredients, ['search_name'], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_auto_20231021_1117'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredients',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Название для поиска'),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredients',
+            index=models.Index(fields=['search_name'], name='ingredients_search_name_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR = '''
+    setweight(to_tsvector('pg_catalog.russian', coalesce({row}name, '')), 'A')
+    || setweight(to_tsvector('pg_catalog.english', coalesce({row}name, '')), 'A')
+    || setweight(to_tsvector('pg_catalog.russian', coalesce({row}text, '')), 'B')
+    || setweight(to_tsvector('pg_catalog.english', coalesce({row}text, '')), 'B')
+'''
+
+FORWARD_SQL = (
+    f'''
+    CREATE FUNCTION recipes_recipes_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER recipes_recipes_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipes
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipes_search_vector_update();
+
+    UPDATE recipes_recipes SET search_vector = {SEARCH_VECTOR.format(row='')};
+
+    CREATE INDEX recipes_search_vector_idx
+    ON recipes_recipes USING gin (search_vector);
+    '''
+)
+
+REVERSE_SQL = '''
+    DROP INDEX IF EXISTS recipes_search_vector_idx;
+    DROP TRIGGER IF EXISTS recipes_recipes_search_vector_trigger
+    ON recipes_recipes;
+    DROP FUNCTION IF EXISTS recipes_recipes_search_vector_update();
+'''
+
+
+def postgresql_only(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredients_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор названия и описания'),
+        ),
+        migrations.RunPython(
+            postgresql_only(FORWARD_SQL), postgresql_only(REVERSE_SQL)
+        ),
+    ]
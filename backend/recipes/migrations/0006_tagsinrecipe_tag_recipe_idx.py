@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipes_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tagsinrecipe',
+            index=models.Index(fields=['tag', 'recipe'], name='tagsinrecipe_tag_recipe_idx'),
+        ),
+    ]
@@ -0,0 +1,165 @@
+import json
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from foodgram.metrics import observe_cache
+
+from recipes.cache import (
+    get_cache_version,
+    get_last_modified,
+    make_cache_key,
+)
+
+
+class ConditionalCacheMixin:
+    """Кэширует сериализованные ответы list и retrieve справочных
+    данных и поддерживает условные запросы.
+
+    Ответ хранится в кэше в пространстве cache_namespace вместе с ETag и
+    временем изменения данных. Повторный запрос с If-None-Match или
+    If-Modified-Since получает 304 без обращения к базе. Версия
+    пространства увеличивается при изменении данных, что инвалидирует
+    все сохранённые ответы; запись живёт не дольше cache_timeout секунд.
+    """
+    cache_namespace = None
+    cache_timeout = settings.REFERENCE_CACHE_TIMEOUT
+
+    def get_cache_parts(self, request, **kwargs):
+        """Части ключа кэша, однозначно задающие содержимое ответа."""
+        return (
+            kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''),
+            urlencode(sorted(request.query_params.lists()), doseq=True),
+        )
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        parts = '\n'.join(map(str, self.get_cache_parts(request, **kwargs)))
+        cache_key = make_cache_key(
+            self.cache_namespace, 'response', self.action,
+            md5(parts.encode()).hexdigest(),
+        )
+        entry = cache.get(cache_key)
+        observe_cache(self.cache_namespace, 'miss' if entry is None else 'hit')
+        if entry is None:
+            last_modified = get_last_modified(self.cache_namespace)
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = json.dumps(
+                response.data, cls=JSONEncoder, sort_keys=True
+            ).encode()
+            entry = {
+                'data': response.data,
+                'etag': quote_etag(md5(body).hexdigest()),
+                'last_modified': last_modified,
+            }
+            cache.set(cache_key, entry, self.cache_timeout)
+        response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Accept',))
+        return get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+            response=response,
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+
+class StaleWhileRevalidateCacheMixin:
+    """Кэширует ответы list и retrieve для анонимных пользователей.
+
+    Запись хранится под ключом нормализованных параметров запроса вместе
+    с версиями пространств кэша, от которых зависит ответ. Запись
+    свежая, пока версии совпадают с текущими. После инвалидации в
+    течение RECIPES_CACHE_STALE_TIMEOUT секунд запись ещё отдаётся, пока
+    ответ перестраивает единственный воркер, захвативший блокировку.
+    """
+    cache_prefix = None
+
+    def get_cache_namespaces(self, request, **kwargs):
+        """Пространства кэша, изменение которых делает ответ устаревшим."""
+        raise NotImplementedError
+
+    def get_cache_query(self, request):
+        """Параметры запроса в виде, не зависящем от их порядка."""
+        return urlencode(sorted(request.query_params.lists()), doseq=True)
+
+    def get_cache_parts(self, request, **kwargs):
+        """Части ключа кэша, однозначно задающие содержимое ответа.
+        Схема и хост входят в ключ, так как ссылки в ответе абсолютные."""
+        return (
+            request.scheme,
+            request.get_host(),
+            kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''),
+            self.get_cache_query(request),
+        )
+
+    def is_stale_usable(self, namespaces):
+        changed = max(map(get_last_modified, namespaces))
+        return time.time() - changed <= settings.RECIPES_CACHE_STALE_TIMEOUT
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        parts = '\n'.join(map(str, self.get_cache_parts(request, **kwargs)))
+        cache_key = ':'.join((
+            self.cache_prefix, self.action, md5(parts.encode()).hexdigest()
+        ))
+        namespaces = self.get_cache_namespaces(request, **kwargs)
+        versions = [get_cache_version(namespace) for namespace in namespaces]
+        entry = cache.get(cache_key)
+        if entry is not None and entry['versions'] == versions:
+            observe_cache(self.cache_prefix, 'hit')
+            return Response(entry['data'])
+        lock_key = f'{cache_key}:lock'
+        locked = cache.add(
+            lock_key, 1, timeout=settings.RECIPES_CACHE_LOCK_TIMEOUT
+        )
+        if (
+            not locked
+            and entry is not None
+            and self.is_stale_usable(namespaces)
+        ):
+            observe_cache(self.cache_prefix, 'stale')
+            return Response(entry['data'])
+        observe_cache(self.cache_prefix, 'miss')
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(
+                    cache_key,
+                    {'versions': versions, 'data': response.data},
+                    settings.RECIPES_CACHE_TIMEOUT,
+                )
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
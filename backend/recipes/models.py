@@ -1,9 +1,68 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models import (
+    BooleanField,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Value,
+    Window,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
 
 from foodgram.settings import LENGTH_NAME
-from users.models import User
+from recipes.cache import (
+    INGREDIENTS_CACHE,
+    TAGS_CACHE,
+    bump_cache_version_on_commit,
+)
+from users.models import User, annotate_is_subscribed
+
+
+def normalize_name(name):
+    """Приводит название к виду для поиска по префиксу без учёта регистра:
+    casefold корректно обрабатывает кириллицу, ё приравнивается к е."""
+    return ' '.join(name.casefold().replace('ё', 'е').split())
+
+
+class CachedQuerySet(models.QuerySet):
+    """Выборка справочных данных, инвалидирующая их кэш при массовых
+    изменениях, для которых Django не отправляет сигналы."""
+    cache_namespace = None
+
+    def bulk_create(self, *args, **kwargs):
+        created = super().bulk_create(*args, **kwargs)
+        bump_cache_version_on_commit(self.cache_namespace)
+        return created
+
+    def bulk_update(self, *args, **kwargs):
+        updated = super().bulk_update(*args, **kwargs)
+        bump_cache_version_on_commit(self.cache_namespace)
+        return updated
+
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        bump_cache_version_on_commit(self.cache_namespace)
+        return updated
+
+
+class IngredientsQuerySet(CachedQuerySet):
+    """Выборка ингредиентов, заполняющая поисковое название при
+    массовой вставке."""
+    cache_namespace = INGREDIENTS_CACHE
+
+    def bulk_create(self, objs, *args, **kwargs):
+        for obj in objs:
+            obj.search_name = normalize_name(obj.name)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class TagQuerySet(CachedQuerySet):
+    cache_namespace = TAGS_CACHE
 
 
 class Ingredients(models.Model):
@@ -11,15 +70,34 @@ class Ingredients(models.Model):
 
     name = models.CharField('Название ингредиента', max_length=200)
     measurement_unit = models.CharField('Единица измерения', max_length=200)
+    search_name = models.CharField(
+        'Название для поиска',
+        max_length=200,
+        editable=False,
+        default='',
+    )
+
+    objects = IngredientsQuerySet.as_manager()
 
     class Meta:
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(
+                fields=['search_name'],
+                name='ingredients_search_name_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name[:LENGTH_NAME]
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Tag(models.Model):
     """Модель данных тегов"""
@@ -43,6 +121,8 @@ class Tag(models.Model):
         null=True,
     )
 
+    objects = TagQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Тег'
@@ -52,6 +132,64 @@ class Tag(models.Model):
         return self.name[:LENGTH_NAME]
 
 
+class RecipesQuerySet(models.QuerySet):
+    """Выборка рецептов, подготовленная для сериализации."""
+
+    def with_related(self):
+        """Подгружает теги и ингредиенты рецептов фиксированным числом
+        запросов. Поисковый вектор для выдачи не нужен и не читается."""
+        return self.defer('search_vector').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientsinrecipe_set',
+                queryset=IngredientsInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def top_per_author(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом с
+        оконной функцией ROW_NUMBER по автору."""
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset
+        if not author_ids:
+            return queryset.none()
+        ranked = queryset.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('id').desc(),
+        )).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit),
+        ))
+
+    def with_user_flags(self, user):
+        """Добавляет признаки is_favorited, is_in_shopping_cart и
+        подписки пользователя на автора рецепта."""
+        author_queryset = annotate_is_subscribed(User.objects.all(), user)
+        queryset = self.prefetch_related(
+            Prefetch('author', queryset=author_queryset)
+        )
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favourite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(Shopping_cart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+
 class Recipes(models.Model):
     """Модель рецептов"""
 
@@ -69,6 +207,11 @@ class Recipes(models.Model):
         'Изображение блюда',
         upload_to='recipes/',
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        editable=False,
+    )
     text = models.TextField(
         'Описание приготовления блюда',
     )
@@ -88,15 +231,63 @@ class Recipes(models.Model):
         'Время приготовления блюда в минутах',
         validators=(MinValueValidator(1),),
     )
+    search_vector = SearchVectorField(
+        'Поисковый вектор названия и описания',
+        null=True,
+        editable=False,
+    )
+    favourites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Количество добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipesQuerySet.as_manager()
+
+    # Поля, которые меняются только отдельными UPDATE (счётчики, копии
+    # изображения) или триггером базы (поисковый вектор). save() их не
+    # перезаписывает значениями, прочитанными в начале запроса.
+    DERIVED_FIELDS = (
+        'favourites_count',
+        'shopping_cart_count',
+        'image_variants',
+        'search_vector',
+    )
 
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-favourites_count', '-shopping_cart_count', '-id'],
+                name='recipes_popular_idx',
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipes_author_id_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name[:LENGTH_NAME]
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.DERIVED_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
 
 class IngredientsInRecipe(models.Model):
     """Модель для связи ингредиентов с рецептами"""
@@ -159,6 +350,12 @@ class TagsInRecipe(models.Model):
                 name='unique_tagsinrecipes',
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='tagsinrecipe_tag_recipe_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.tag}.'
@@ -223,3 +420,38 @@ class Shopping_cart(models.Model):
     def __str__(self):
         return (f'{self.user.username} добавил рецепт '
                 f'{self.recipe.name} для списка покупок.')
+
+
+class ShoppingCartTotal(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+
+    Таблица поддерживается инкрементально при изменении списка покупок и
+    состава рецептов в нём и перестраивается командой command_cart_totals.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Зарегистрированный пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_total',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.amount} {self.ingredient}.'
@@ -1,5 +1,52 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework import exceptions
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from recipes.filters import RecipesOrderingFilter
+
+
+class KeysetPaginator(CursorPagination):
+    """Курсорная пагинация по сортировке модели по умолчанию.
+
+    Следующая страница выбирается условием по ключу сортировки, поэтому
+    глубокие страницы стоят столько же, сколько первая, и не требуют
+    COUNT(*) по всей выборке. Сортировка по релевантности поиска в этом
+    режиме заменяется сортировкой модели. Явная сортировка ordering
+    (например, popular по изменяющимся счётчикам) не даёт устойчивого
+    ключа, и такой запрос отклоняется.
+    """
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(
+            RecipesOrderingFilter.ordering_param
+        )
+        if ordering in RecipesOrderingFilter.orderings:
+            raise exceptions.ValidationError({
+                'detail': f'Сортировка {ordering} недоступна с параметром '
+                          f'{self.cursor_query_param}, используйте page.'
+            })
+        return tuple(queryset.model._meta.ordering)
 
 
 class CustomPaginator(PageNumberPagination):
+    """Постраничная пагинация; параметр cursor включает курсорный режим."""
     page_size_query_param = 'limit'
+    keyset_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPaginator.cursor_query_param in request.query_params:
+            self.keyset_paginator = KeysetPaginator()
+            return self.keyset_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_html_context()
+        return super().get_html_context()
@@ -0,0 +1,18 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from recipes.importer import ImportFormatError, parse_items
+
+
+class NDJSONParser(BaseParser):
+    """Разбирает тело из JSON-объектов по одному в строке в список."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return parse_items(stream.read().decode(encoding))
+        except (ImportFormatError, UnicodeDecodeError) as error:
+            raise ParseError(f'Ошибка разбора NDJSON: {error}')
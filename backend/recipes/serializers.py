@@ -1,8 +1,15 @@
+from django.conf import settings
 from django.db import transaction
-from django.shortcuts import get_object_or_404
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 
+from recipes import cart_totals
+from recipes.cache import bump_recipe_cache
+from recipes.fields import (
+    ImageVariantsField,
+    PrimaryKeysField,
+    StreamingBase64ImageField,
+)
 from recipes.models import (
     Ingredients,
     IngredientsInRecipe,
@@ -10,6 +17,8 @@ from recipes.models import (
     Tag,
     Favourite,
     Shopping_cart,
+    ShoppingCartTotal,
+    TagsInRecipe,
 )
 from users.serializers import UserSerializer
 
@@ -43,6 +52,13 @@ class IngredientsInRecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+class ShoppingCartTotalSerializer(IngredientsInRecipeReadSerializer):
+    """Сериалайзер для итогов списка покупок."""
+
+    class Meta(IngredientsInRecipeReadSerializer.Meta):
+        model = ShoppingCartTotal
+
+
 class RecipesReadSerializer(serializers.ModelSerializer):
     """Сериалайзер для чтения рецептов."""
     author = UserSerializer(read_only=True)
@@ -55,6 +71,7 @@ class RecipesReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipes
@@ -67,11 +84,14 @@ class RecipesReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (
             self.context.get('request').user.is_authenticated
             and Favourite.objects.filter(
@@ -80,6 +100,8 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (
             self.context.get('request').user.is_authenticated
             and Shopping_cart.objects.filter(
@@ -101,11 +123,8 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientsInRecipeCreateSerializer(
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
-    image = Base64ImageField()
+    tags = PrimaryKeysField(queryset=Tag.objects.all())
+    image = StreamingBase64ImageField()
     author = UserSerializer(read_only=True)
 
     class Meta:
@@ -128,39 +147,27 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
             )
         return image
 
-    def validate(self, ingredients):
-
+    def validate(self, data):
+        ingredients = data.get('ingredients')
+        if ingredients is None and self.partial:
+            return data
         if not ingredients:
             raise serializers.ValidationError(
                 {'detail': 'Для рецепта необходимо добавить ингредиенты!'},
                 code=status.HTTP_400_BAD_REQUEST
             )
-        ingredients_unique_list = []
-        for ingredientinrecipe in ingredients:
-            try:
-                ingredient = get_object_or_404(
-                    Ingredients,
-                    id=ingredientinrecipe['id']
-                )
-            except Exception:
-                raise serializers.ValidationError(
-                    {'detail': 'Нет такого ингредиента!'},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            amount = ingredientinrecipe['amount']
-            if int(amount) <= 0:
-                raise serializers.ValidationError(
-                    {'detail': 'Количество должно быть больше 0!'},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            elif ingredient in ingredients_unique_list:
-                raise serializers.ValidationError(
-                    {'detail': 'Ингредиенты не должны повторяться!'},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            else:
-                ingredients_unique_list.append(ingredient)
-        return ingredients
+        ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ids) != len(ingredients):
+            raise serializers.ValidationError(
+                {'detail': 'Ингредиенты не должны повторяться!'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        if Ingredients.objects.filter(id__in=ids).count() != len(ids):
+            raise serializers.ValidationError(
+                {'detail': 'Нет такого ингредиента!'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        return data
 
     def validate_tags(self, tags):
         if not tags:
@@ -168,21 +175,35 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
                 {'detail': 'Должен быть хотя бы один тег!'},
                 code=status.HTTP_400_BAD_REQUEST
             )
-        tags_unique_list = []
-        for tag in tags:
-            if tag in tags_unique_list:
-                raise serializers.ValidationError(
-                    {'detail': 'Теги не должны повторяться!'},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            tags_unique_list.append(tag)
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError(
+                {'detail': 'Теги не должны повторяться!'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
         return tags
 
-    @transaction.atomic
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл уже перемещён в хранилище, закрываем его явно,
+            # как Django закрывает загруженные файлы запроса.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
+    def create_tags(self, tags, recipe):
+        if tags:
+            TagsInRecipe.objects.bulk_create(
+                [TagsInRecipe(recipe=recipe, tag=tag) for tag in tags]
+            )
+
     def create_ingredients_amounts(self, ingredients, recipe):
+        if not ingredients:
+            return
         IngredientsInRecipe.objects.bulk_create(
             [IngredientsInRecipe(
-                ingredient=Ingredients.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
@@ -196,37 +217,158 @@ class RecipesCreateSerializer(serializers.ModelSerializer):
             author=self.context['request'].user,
             **validated_data
         )
-        recipe.tags.set(tags)
+        self.create_tags(tags, recipe)
         self.create_ingredients_amounts(recipe=recipe, ingredients=ingredients)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(
-            recipe=instance,
-            ingredients=ingredients
-        )
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_ingredients_amounts(instance, ingredients)
+        if not validated_data:
+            # Строка рецепта не меняется, но ответы с ним устарели.
+            transaction.on_commit(lambda: bump_recipe_cache(
+                instance.pk, instance.author_id
+            ))
+            return instance
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+    def update_tags(self, instance, tags):
+        """Добавляет и удаляет только изменившиеся связи с тегами."""
+        old = {tag.id for tag in instance.tags.all()}
+        new = {tag.id for tag in tags}
+        if old - new:
+            TagsInRecipe.objects.filter(
+                recipe=instance, tag_id__in=old - new
+            ).delete()
+        if new - old:
+            self.create_tags(
+                [tag for tag in tags if tag.id not in old], instance
+            )
 
-        return super().update(instance, validated_data)
+    def update_ingredients_amounts(self, instance, ingredients):
+        """Применяет к составу рецепта только разницу со строками в базе:
+        вставки, удаления и изменения количества."""
+        cart_totals.lock_recipes([instance.pk])
+        rows = {
+            row.ingredient_id: row
+            for row in instance.ingredientsinrecipe_set.all()
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        if old_amounts == new_amounts:
+            return
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            IngredientsInRecipe.objects.filter(
+                recipe=instance, ingredient_id__in=removed
+            ).delete()
+        self.create_ingredients_amounts([
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in rows
+        ], instance)
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = new_amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientsInRecipe.objects.bulk_update(changed, ['amount'])
+        cart_totals.change_recipe(instance, old_amounts, new_amounts)
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        # Перечитываем рецепт с предзагрузкой, чтобы число запросов не
+        # зависело от количества ингредиентов.
+        instance = Recipes.objects.with_related().with_user_flags(
+            request.user
+        ).get(pk=instance.pk)
         return RecipesReadSerializer(instance, context=context).data
 
 
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Сериалайзер рецепта при массовом импорте.
+
+    Ссылки на теги и ингредиенты сверяются с множествами tag_ids и
+    ingredient_ids из контекста, загруженными один раз на весь импорт.
+    """
+    ingredients = IngredientsInRecipeCreateSerializer(many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = StreamingBase64ImageField()
+
+    class Meta:
+        model = Recipes
+        fields = (
+            'ingredients',
+            'tags',
+            'image',
+            'name',
+            'text',
+            'cooking_time',
+        )
+
+    def validate_tags(self, tags):
+        if not tags:
+            raise serializers.ValidationError('Должен быть хотя бы один тег!')
+        if len(set(tags)) != len(tags):
+            raise serializers.ValidationError('Теги не должны повторяться!')
+        unknown = set(tags) - self.context['tag_ids']
+        if unknown:
+            raise serializers.ValidationError(
+                f'Нет тегов: {", ".join(map(str, sorted(unknown)))}.'
+            )
+        return tags
+
+    def validate_ingredients(self, ingredients):
+        if not ingredients:
+            raise serializers.ValidationError(
+                'Для рецепта необходимо добавить ингредиенты!'
+            )
+        ids = [ingredient['id'] for ingredient in ingredients]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться!'
+            )
+        unknown = set(ids) - self.context['ingredient_ids']
+        if unknown:
+            raise serializers.ValidationError(
+                f'Нет ингредиентов: {", ".join(map(str, sorted(unknown)))}.'
+            )
+        return ingredients
+
+
 class RecipesSerializer(serializers.ModelSerializer):
     """Сериалайзер для рецептов без ингредиентов."""
     image = Base64ImageField(read_only=True)
+    image_variants = ImageVariantsField(sizes=('small', 'medium'))
     name = serializers.ReadOnlyField()
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
         model = Recipes
         fields = ('id', 'name',
-                  'image', 'cooking_time')
+                  'image', 'image_variants', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового изменения избранного или списка
+    покупок."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BULK_MAX_ITEMS,
+    )
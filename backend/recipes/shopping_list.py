@@ -0,0 +1,162 @@
+import csv
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from recipes.models import ShoppingCartTotal
+
+TITLE = 'Список покупок:'
+
+
+def shopping_list_rows(user):
+    """Сводные строки списка покупок пользователя из его итогов.
+
+    Строки читаются серверным курсором пачками, поэтому большой список
+    не загружается в память воркера целиком.
+    """
+    return ShoppingCartTotal.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by(
+        'ingredient__name'
+    ).iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+
+
+def spooled_file():
+    """Временный файл, который остаётся в памяти до
+    SHOPPING_LIST_SPOOL_MAX_MEMORY байт, а затем сбрасывается на диск."""
+    return SpooledTemporaryFile(
+        max_size=settings.SHOPPING_LIST_SPOOL_MAX_MEMORY
+    )
+
+
+def format_row(row):
+    return (
+        f'- {row["ingredient__name"]} '
+        f'({row["ingredient__measurement_unit"]})'
+        f' - {row["amount"]}'
+    )
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанное вместо хранения."""
+
+    def write(self, value):
+        return value
+
+
+class TextRenderer:
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def render(self, rows):
+        yield TITLE
+        for row in rows:
+            yield '\n' + format_row(row)
+
+    def response(self, rows, filename, buffered=False):
+        """Потоковый ответ, строки читаются при его отдаче.
+
+        С buffered список записывается во временный файл до возврата
+        ответа: под ASGI Django 3.2 перебирает потоковый ответ в цикле
+        событий, где запросы к базе запрещены.
+        """
+        if buffered:
+            output = spooled_file()
+            for part in self.render(rows):
+                output.write(part.encode())
+            output.seek(0)
+            return FileResponse(
+                output,
+                as_attachment=True,
+                filename=filename,
+                content_type=self.content_type,
+            )
+        response = StreamingHttpResponse(
+            self.render(rows), content_type=self.content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
+
+class CsvRenderer(TextRenderer):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def render(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+        for row in rows:
+            yield writer.writerow((
+                row['ingredient__name'],
+                row['ingredient__measurement_unit'],
+                row['amount'],
+            ))
+
+
+class PdfRenderer:
+    """Рендерит список в PDF постранично во временный файл, который
+    остаётся в памяти до SHOPPING_LIST_SPOOL_MAX_MEMORY байт, а затем
+    сбрасывается на диск, и отдаётся потоком."""
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not os.path.exists(font_path):
+            return 'Helvetica'
+        pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def render(self, rows, output):
+        font = self.get_font()
+        _, height = A4
+        line_height = self.font_size * 1.5
+        canvas = Canvas(output, pagesize=A4)
+        canvas.setTitle(TITLE.rstrip(':'))
+        canvas.setFont(font, self.font_size)
+        y = height - self.margin
+        for line in self.lines(rows):
+            if y < self.margin:
+                canvas.showPage()
+                canvas.setFont(font, self.font_size)
+                y = height - self.margin
+            canvas.drawString(self.margin, y, line)
+            y -= line_height
+        canvas.save()
+
+    def lines(self, rows):
+        yield TITLE
+        for row in rows:
+            yield format_row(row)
+
+    def response(self, rows, filename, buffered=True):
+        output = spooled_file()
+        self.render(rows, output)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=filename,
+            content_type=self.content_type,
+        )
+
+
+RENDERERS = {
+    renderer.extension: renderer
+    for renderer in (TextRenderer, CsvRenderer, PdfRenderer)
+}
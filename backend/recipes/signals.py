@@ -0,0 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes import cart_totals, images
+from recipes.cache import (
+    INGREDIENTS_CACHE,
+    TAGS_CACHE,
+    bump_author_cache,
+    bump_cache_version_on_commit,
+    bump_recipe_cache,
+)
+from recipes.models import Ingredients, Recipes, Tag
+from users.models import User
+
+# Поля пользователя, которые выдаются в рецептах как данные автора.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Ingredients)
+def invalidate_ingredients_cache(sender, **kwargs):
+    bump_cache_version_on_commit(INGREDIENTS_CACHE)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags_cache(sender, **kwargs):
+    bump_cache_version_on_commit(TAGS_CACHE)
+
+
+@receiver((post_save, post_delete), sender=Recipes)
+def invalidate_recipes_cache(sender, instance, **kwargs):
+    """Инвалидирует ответы с рецептом после фиксации транзакции, когда
+    теги и ингредиенты рецепта уже сохранены."""
+    recipe_id, author_id = instance.pk, instance.author_id
+    transaction.on_commit(lambda: bump_recipe_cache(recipe_id, author_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cache(sender, instance, created, update_fields,
+                            **kwargs):
+    """Инвалидирует ответы с рецептами автора после изменения его
+    профиля. Сохранения других полей, например last_login при входе, не
+    затрагивают кэш."""
+    if created or (
+        update_fields is not None and not AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    author_id = instance.pk
+
+    def invalidate():
+        recipe_ids = list(Recipes.objects.filter(
+            author_id=author_id
+        ).values_list('id', flat=True))
+        if recipe_ids:
+            bump_author_cache(author_id, recipe_ids)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Recipes)
+def process_recipe_image(sender, instance, **kwargs):
+    if images.needs_processing(instance):
+        images.schedule(instance.pk)
+
+
+@receiver(pre_delete, sender=Recipes)
+def remove_recipe_from_cart_totals(sender, instance, **kwargs):
+    cart_totals.lock_recipes([instance.pk])
+    cart_totals.change_recipe(
+        instance, cart_totals.recipe_amounts(instance), {}
+    )
@@ -0,0 +1,127 @@
+"""Изменение избранного и списка покупок пользователя.
+
+Один рецепт добавляется одним INSERT ... ON CONFLICT DO NOTHING и
+удаляется одним DELETE: повторный или параллельный запрос не приводит
+к ошибке целостности, а число затронутых строк показывает, изменился
+ли список. При массовом изменении рецепты добавляются одним INSERT,
+пропускающим уже существующие связи и несуществующие рецепты, и
+удаляются одним DELETE. На PostgreSQL оба запроса возвращают
+затронутые рецепты через RETURNING, поэтому отчёт об изменениях и
+счётчики точны и при параллельных запросах; на других базах
+затронутые связи определяются предварительной выборкой.
+"""
+from django.db import connection, transaction
+
+from foodgram.db import insert_ignore
+from recipes import cart_totals, counters
+from recipes.models import Favourite, Recipes, Shopping_cart
+
+LISTS = {
+    'favorite': (Favourite, counters.FAVOURITES),
+    'shopping_cart': (Shopping_cart, counters.SHOPPING_CART),
+}
+
+
+def _columns(model):
+    quote = connection.ops.quote_name
+    return (
+        quote(model._meta.db_table),
+        quote(model._meta.get_field('user').column),
+        quote(model._meta.get_field('recipe').column),
+    )
+
+
+def insert_recipes(model, user, recipe_ids):
+    """Добавляет связи с рецептами и возвращает id добавленных."""
+    if connection.vendor == 'postgresql':
+        table, user_column, recipe_column = _columns(model)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user_column}, {recipe_column}) '
+                f'SELECT %s, id FROM '
+                f'{connection.ops.quote_name(Recipes._meta.db_table)} '
+                f'WHERE id = ANY(%s) '
+                f'ON CONFLICT DO NOTHING RETURNING {recipe_column}',
+                [user.id, list(recipe_ids)],
+            )
+            return {row[0] for row in cursor.fetchall()}
+    existing = set(
+        Recipes.objects.filter(id__in=recipe_ids).values_list('id', flat=True)
+    )
+    existing -= set(model.objects.filter(
+        user=user, recipe_id__in=existing
+    ).values_list('recipe_id', flat=True))
+    model.objects.bulk_create(
+        [model(user=user, recipe_id=recipe_id) for recipe_id in existing],
+        ignore_conflicts=True,
+    )
+    return existing
+
+
+def delete_recipes(model, user, recipe_ids):
+    """Удаляет связи с рецептами и возвращает id удалённых."""
+    if connection.vendor == 'postgresql':
+        table, user_column, recipe_column = _columns(model)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {recipe_column} = ANY(%s) RETURNING {recipe_column}',
+                [user.id, list(recipe_ids)],
+            )
+            return {row[0] for row in cursor.fetchall()}
+    links = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+    deleted = set(links.values_list('recipe_id', flat=True))
+    links.delete()
+    return deleted
+
+
+@transaction.atomic
+def add(name, user, recipe):
+    """Добавляет рецепт в список name пользователя и возвращает False,
+    если рецепт уже был в списке."""
+    model, field = LISTS[name]
+    if not insert_ignore(model, user=user, recipe=recipe):
+        return False
+    if model is Shopping_cart:
+        cart_totals.add_recipe(user, recipe)
+    counters.on_commit_change(recipe.id, field, 1)
+    return True
+
+
+@transaction.atomic
+def remove(name, user, recipe_id):
+    """Удаляет рецепт из списка name пользователя и возвращает False,
+    если рецепта в списке не было."""
+    model, field = LISTS[name]
+    deleted, _ = model.objects.filter(
+        user=user, recipe_id=recipe_id
+    ).delete()
+    if not deleted:
+        return False
+    if model is Shopping_cart:
+        cart_totals.remove_recipe(user, recipe_id)
+    counters.on_commit_change(recipe_id, field, -1)
+    return True
+
+
+@transaction.atomic
+def change(name, user, recipe_ids, add=True):
+    """Добавляет рецепты в список name пользователя или удаляет их и
+    возвращает отсортированные id изменившихся рецептов."""
+    model, field = LISTS[name]
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return []
+    if add:
+        changed = insert_recipes(model, user, recipe_ids)
+    else:
+        changed = delete_recipes(model, user, recipe_ids)
+    if not changed:
+        return []
+    if model is Shopping_cart:
+        if add:
+            cart_totals.add_recipes(user, changed)
+        else:
+            cart_totals.remove_recipes(user, changed)
+    counters.on_commit_change_many(changed, field, 1 if add else -1)
+    return sorted(changed)
@@ -1,102 +1,196 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import get_object_or_404
+from django.utils.http import urlencode
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import exceptions, filters, permissions, status, viewsets
+from rest_framework import exceptions, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
 from recipes.models import (
-    Favourite,
     Ingredients,
-    IngredientsInRecipe,
     Recipes,
-    Shopping_cart,
+    ShoppingCartTotal,
     Tag
 )
-from .filters import RecipesFilter
+from . import user_lists
+from .cache import (
+    INGREDIENTS_CACHE,
+    RECIPES_CACHE,
+    TAGS_CACHE,
+    author_recipes_cache,
+    recipe_cache,
+)
+from .filters import (
+    IngredientsSearchFilter,
+    RecipesFilter,
+    RecipesOrderingFilter,
+    RecipesSearchFilter,
+)
 from .serializers import (
     IngredientsSerializer,
+    ShoppingCartTotalSerializer,
     TagsSerializer,
     RecipesSerializer,
     RecipesReadSerializer,
-    RecipesCreateSerializer
+    RecipesCreateSerializer,
+    RecipeIdsSerializer,
 )
+from .importer import import_recipes
+from .mixins import ConditionalCacheMixin, StaleWhileRevalidateCacheMixin
 from .pagination import CustomPaginator
+from .parsers import NDJSONParser
 from .permissions import (
     IsAuthorOrAdminOrReadOnly,
 )
+from .shopping_list import RENDERERS, shopping_list_rows
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(
+    ConditionalCacheMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredients.objects.all()
     serializer_class = IngredientsSerializer
     pagination_class = None
-    filter_backends = (filters.SearchFilter, )
-    search_fields = ('^name', )
+    filter_backends = (IngredientsSearchFilter, )
+    cache_namespace = INGREDIENTS_CACHE
+    cache_timeout = settings.INGREDIENTS_SEARCH_CACHE_TIMEOUT
+
+    def get_cache_parts(self, request, **kwargs):
+        if self.action == 'list':
+            return ('prefix', IngredientsSearchFilter().get_prefix(request))
+        return super().get_cache_parts(request, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if (
+            self.action == 'list'
+            and IngredientsSearchFilter().get_prefix(self.request)
+        ):
+            return queryset[:settings.INGREDIENTS_SEARCH_LIMIT]
+        return queryset
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(ConditionalCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
     pagination_class = None
+    cache_namespace = TAGS_CACHE
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RequestTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_too_large'
+
+
+class RecipesViewSet(
+    StaleWhileRevalidateCacheMixin, viewsets.ModelViewSet
+):
     queryset = Recipes.objects.all()
     pagination_class = CustomPaginator
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
-    filter_backends = (filters.SearchFilter, DjangoFilterBackend)
-    search_fields = ('name',)
+    filter_backends = (
+        RecipesSearchFilter,
+        DjangoFilterBackend,
+        RecipesOrderingFilter,
+    )
     filterset_class = RecipesFilter
+    cache_prefix = 'recipes-response'
+
+    def get_max_body(self):
+        """Наибольший размер тела запроса действия или None."""
+        if self.action in ('create', 'update', 'partial_update'):
+            return settings.RECIPE_UPLOAD_MAX_BODY
+        if self.action == 'bulk_import':
+            return settings.RECIPES_IMPORT_MAX_BODY
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        max_body = self.get_max_body()
+        if max_body is not None:
+            # Отказываем до разбора JSON, не читая тело запроса.
+            try:
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > max_body:
+                raise RequestTooLarge()
+
+    def get_cache_namespaces(self, request, **kwargs):
+        if self.action == 'retrieve':
+            namespace = recipe_cache(kwargs.get('pk'))
+        else:
+            authors = request.query_params.getlist('author')
+            if len(authors) == 1 and authors[0].strip().isdigit():
+                namespace = author_recipes_cache(int(authors[0]))
+            else:
+                namespace = RECIPES_CACHE
+        return [namespace, TAGS_CACHE, INGREDIENTS_CACHE]
+
+    def get_cache_query(self, request):
+        """Нормализует параметры выборки: порядок и повторы значений,
+        пробелы и регистр поискового запроса, первую страницу."""
+        params = set()
+        for key, values in request.query_params.lists():
+            for value in values:
+                value = ' '.join(value.split())
+                if key == api_settings.SEARCH_PARAM:
+                    value = value.casefold()
+                if value and (key, value) != ('page', '1'):
+                    params.add((key, value))
+        return urlencode(sorted(params))
+
+    def get_queryset(self):
+        return Recipes.objects.with_related().with_user_flags(
+            self.request.user
+        )
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return (RecipesReadSerializer)
         return (RecipesCreateSerializer)
 
+    def add_to_list(self, request, name, message):
+        recipe = get_object_or_404(
+            Recipes.objects.only(
+                'id', 'name', 'image', 'image_variants', 'cooking_time'
+            ),
+            id=self.kwargs['pk'],
+        )
+        if not user_lists.add(name, request.user, recipe):
+            raise exceptions.ValidationError(
+                {'detail': message}, code=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = RecipesSerializer(recipe, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def remove_from_list(self, request, name, message):
+        if not user_lists.remove(name, request.user, self.kwargs['pk']):
+            raise exceptions.ValidationError(
+                {'detail': 'Невозможно выполнить!'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {'detail': message}, status=status.HTTP_204_NO_CONTENT
+        )
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         permission_classes=[permissions.IsAuthenticated]
     )
     def favorite(self, request, **kwargs):
-        try:
-            recipe = get_object_or_404(Recipes, id=kwargs['pk'])
-            if request.method == 'POST':
-                serializer = RecipesSerializer(
-                    recipe, data=request.data,
-                    context={'request': request}
-                )
-                serializer.is_valid(raise_exception=True)
-                if not Favourite.objects.filter(
-                    user=request.user,
-                    recipe=recipe
-                ).exists():
-                    Favourite.objects.create(user=request.user, recipe=recipe)
-                    return Response(
-                        serializer.data,
-                        status=status.HTTP_201_CREATED
-                    )
-                return Response(
-                    {'detail': 'Рецепт уже был добавлен в избранное.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            if request.method == 'DELETE':
-                get_object_or_404(
-                    Favourite, user=request.user,
-                    recipe=recipe
-                ).delete()
-                return Response(
-                    {'detail': 'Рецепт удален из избранного.'},
-                    status=status.HTTP_204_NO_CONTENT
-                )
-        except Exception:
-            raise exceptions.ValidationError(
-                {'detail': 'Невозможно выполнить!'},
-                code=status.HTTP_400_BAD_REQUEST
+        if request.method == 'POST':
+            return self.add_to_list(
+                request, 'favorite', 'Рецепт уже был добавлен в избранное.'
             )
+        return self.remove_from_list(
+            request, 'favorite', 'Рецепт удален из избранного.'
+        )
 
     @action(
         detail=True,
@@ -105,64 +199,109 @@ class RecipesViewSet(viewsets.ModelViewSet):
         pagination_class=None
     )
     def shopping_cart(self, request, **kwargs):
-        try:
-            recipe = get_object_or_404(Recipes, id=kwargs['pk'])
-            if request.method == 'POST':
-                serializer = RecipesSerializer(
-                    recipe, data=request.data,
-                    context={'request': request}
-                )
-                serializer.is_valid(raise_exception=True)
-                if not Shopping_cart.objects.filter(
-                    user=request.user,
-                    recipe=recipe
-                ).exists():
-                    Shopping_cart.objects.create(
-                        user=request.user,
-                        recipe=recipe
-                    )
-                    return Response(serializer.data,
-                                    status=status.HTTP_201_CREATED)
-                return Response(
-                    {'detail': 'Рецепт уже есть в спике покупок.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            if request.method == 'DELETE':
-                get_object_or_404(
-                    Shopping_cart,
-                    user=request.user,
-                    recipe=recipe
-                ).delete()
-                return Response(
-                    {'detail': 'Рецепт успешно удален из списка покупок.'},
-                    status=status.HTTP_204_NO_CONTENT
-                )
-        except Exception:
+        if request.method == 'POST':
+            return self.add_to_list(
+                request, 'shopping_cart', 'Рецепт уже есть в спике покупок.'
+            )
+        return self.remove_from_list(
+            request, 'shopping_cart',
+            'Рецепт успешно удален из списка покупок.'
+        )
+
+    def change_list(self, request, name):
+        """Добавляет рецепты в список пользователя или удаляет их одним
+        запросом к базе и сообщает, какие id изменились."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        changed = user_lists.change(
+            name, request.user, recipe_ids,
+            add=request.method == 'POST',
+        )
+        return Response({
+            'changed': changed,
+            'unchanged': sorted(set(recipe_ids) - set(changed)),
+        })
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def favorite_bulk(self, request, **kwargs):
+        return self.change_list(request, 'favorite')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request, **kwargs):
+        return self.change_list(request, 'shopping_cart')
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def download_shopping_cart(self, request, **kwargs):
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in RENDERERS:
             raise exceptions.ValidationError(
-                {'detail': 'Невозможно выполнить!'},
+                {'detail': 'Доступные форматы: '
+                           f'{", ".join(RENDERERS)}.'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        renderer = RENDERERS[file_format]()
+        filename = (
+            f'{request.user.username}_shopping_list.{renderer.extension}'
+        )
+        return renderer.response(
+            shopping_list_rows(request.user),
+            filename,
+            buffered=isinstance(request._request, ASGIRequest),
+        )
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=(permissions.IsAuthenticated,),
+        parser_classes=(JSONParser, NDJSONParser),
+    )
+    def bulk_import(self, request, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise exceptions.ValidationError(
+                {'detail': 'Ожидается массив рецептов или NDJSON.'},
                 code=status.HTTP_400_BAD_REQUEST
             )
+        if len(items) > settings.RECIPES_IMPORT_MAX_ITEMS:
+            raise exceptions.ValidationError(
+                {'detail': 'За один запрос можно импортировать не более '
+                           f'{settings.RECIPES_IMPORT_MAX_ITEMS} рецептов.'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        report = import_recipes(items, request.user)
+        created = sum('id' in entry for entry in report)
+        return Response({
+            'created': created,
+            'failed': len(report) - created,
+            'results': report,
+        })
 
     @action(
         detail=False,
         methods=['get'],
         permission_classes=(permissions.IsAuthenticated,)
     )
-    def download_shopping_cart(self, request, **kwargs):
-        ingredients = IngredientsInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        shopping_list = 'Список покупок:\n'
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        filename = f'{request.user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
+    def shopping_cart_summary(self, request, **kwargs):
+        totals = ShoppingCartTotal.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = ShoppingCartTotalSerializer(totals, many=True)
+        return Response(serializer.data)
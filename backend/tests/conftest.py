@@ -0,0 +1,168 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.cart_totals import rebuild
+from recipes.counters import recount
+from recipes.models import (
+    Favourite,
+    Ingredients,
+    IngredientsInRecipe,
+    Recipes,
+    Shopping_cart,
+    Tag,
+)
+from users.models import Subscribe, User
+
+AUTHORS_COUNT = 12
+RECIPES_PER_AUTHOR = 6
+INGREDIENTS_COUNT = 60
+INGREDIENTS_PER_RECIPE = 8
+
+PNG_1X1 = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhg'
+    'GAWjR9awAAAABJRU5ErkJggg=='
+)
+IMAGE = f'data:image/png;base64,{PNG_1X1}'
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(
+    django_db_modify_db_settings_parallel_suffix, tmp_path_factory,
+):
+    """Тестовая база SQLite хранится в файле, а не в памяти с общим
+    кэшем: параллельные запросы тогда ждут блокировку до timeout секунд,
+    а не получают ошибку сразу."""
+    from django.conf import settings
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        database.setdefault('TEST', {})['NAME'] = str(
+            tmp_path_factory.mktemp('db') / 'test.sqlite3'
+        )
+        database.setdefault('OPTIONS', {})['timeout'] = 30
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='reader',
+        email='reader@foodgram.ru',
+        password='Reader-password-1',
+        first_name='Иван',
+        last_name='Читатель',
+    )
+
+
+@pytest.fixture
+def superuser(django_user_model):
+    return django_user_model.objects.create_superuser(
+        username='admin',
+        email='admin@foodgram.ru',
+        password='Admin-password-1',
+    )
+
+
+def _client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def anon_client():
+    return _client_for()
+
+
+@pytest.fixture
+def user_client(user):
+    return _client_for(user)
+
+
+@pytest.fixture
+def superuser_client(superuser):
+    return _client_for(superuser)
+
+
+@pytest.fixture
+def dataset(user, superuser):
+    """Наполняет базу авторами, рецептами, избранным, списком покупок
+    и подписками в объёмах, достаточных для нескольких страниц выдачи."""
+    Tag.objects.bulk_create([
+        Tag(name=name, color=color, slug=slug)
+        for name, color, slug in (
+            ('Завтрак', '#E26C2D', 'breakfast'),
+            ('Обед', '#49B64E', 'lunch'),
+            ('Ужин', '#8775D2', 'dinner'),
+        )
+    ])
+    tags = list(Tag.objects.order_by('id'))
+    Ingredients.objects.bulk_create([
+        Ingredients(name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(INGREDIENTS_COUNT)
+    ])
+    ingredients = list(Ingredients.objects.order_by('id'))
+    User.objects.bulk_create([
+        User(
+            username=f'author{number}',
+            email=f'author{number}@foodgram.ru',
+            first_name='Автор',
+            last_name=str(number),
+        )
+        for number in range(AUTHORS_COUNT)
+    ])
+    authors = list(User.objects.filter(username__startswith='author'))
+    Recipes.objects.bulk_create([
+        Recipes(
+            name=f'Рецепт {author.username}-{number}',
+            author=author,
+            image='recipes/image.png',
+            text='Описание приготовления',
+            cooking_time=10 + number,
+        )
+        for author in authors
+        for number in range(RECIPES_PER_AUTHOR)
+    ])
+    recipes = list(Recipes.objects.order_by('id'))
+    Recipes.tags.through.objects.bulk_create([
+        Recipes.tags.through(recipe=recipe, tag=tags[index % len(tags)])
+        for index, recipe in enumerate(recipes)
+    ])
+    IngredientsInRecipe.objects.bulk_create([
+        IngredientsInRecipe(
+            recipe=recipe,
+            ingredient=ingredients[(index + offset) % INGREDIENTS_COUNT],
+            amount=offset + 1,
+        )
+        for index, recipe in enumerate(recipes)
+        for offset in range(INGREDIENTS_PER_RECIPE)
+    ])
+    Favourite.objects.bulk_create([
+        Favourite(user=user, recipe=recipe) for recipe in recipes[::2]
+    ])
+    Shopping_cart.objects.bulk_create([
+        Shopping_cart(user=user, recipe=recipe) for recipe in recipes[::3]
+    ])
+    Subscribe.objects.bulk_create([
+        Subscribe(user=user, author=author) for author in authors[::2]
+    ])
+    rebuild()
+    recount()
+    return {
+        'tags': tags,
+        'ingredients': ingredients,
+        'authors': authors,
+        'recipes': recipes,
+    }
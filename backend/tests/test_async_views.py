@@ -0,0 +1,148 @@
+import asyncio
+import json
+import re
+from time import perf_counter, sleep
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.test import AsyncClient
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+from rest_framework.response import Response
+
+from foodgram.async_views import ASYNC_ROUTES, async_urls
+from foodgram.urls import router
+from recipes.views import TagsViewSet
+from tests.test_shopping_list import expected_totals
+
+# Маршруты API с асинхронными обёртками, как при ASYNC_VIEWS=1.
+urlpatterns = [path('api/', include(async_urls(router.urls)))]
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+READ_URLS = (
+    '/api/recipes/',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/{recipe}/',
+    '/api/tags/',
+    '/api/tags/{tag}/',
+    '/api/ingredients/?name=ингр',
+    '/api/users/subscriptions/?recipes_limit=2',
+)
+
+
+@pytest.fixture
+def async_api(settings):
+    settings.ROOT_URLCONF = __name__
+
+
+def async_get(url, user=None):
+    headers = {}
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        headers['authorization'] = f'Token {token.key}'
+
+    async def get():
+        return await AsyncClient().get(url, **headers)
+    return async_to_sync(get)()
+
+
+def test_async_urls_wrap_read_routes():
+    for pattern in async_urls(router.urls):
+        assert asyncio.iscoroutinefunction(pattern.callback) == (
+            pattern.name in ASYNC_ROUTES
+        ), pattern.name
+
+
+@pytest.mark.parametrize('url', READ_URLS)
+def test_async_responses_match_sync(
+    user, user_client, dataset, settings, url,
+):
+    url = url.format(
+        recipe=dataset['recipes'][1].id, tag=dataset['tags'][0].id,
+    )
+    expected = user_client.get(url)
+    cache.clear()
+    settings.ROOT_URLCONF = __name__
+    response = async_get(url, user)
+    assert response.status_code == expected.status_code == 200
+    assert json.loads(response.content) == json.loads(expected.content)
+
+
+def test_async_views_run_concurrently(async_api, monkeypatch):
+    def slow_list(self, request, *args, **kwargs):
+        sleep(0.2)
+        return Response([])
+
+    monkeypatch.setattr(TagsViewSet, 'list', slow_list)
+    client = AsyncClient()
+
+    async def gather():
+        # Пять запросов по 0,2 с в одном цикле событий.
+        return await asyncio.gather(
+            *(client.get('/api/tags/') for _ in range(5))
+        )
+
+    start = perf_counter()
+    responses = async_to_sync(gather)()
+    assert [response.status_code for response in responses] == [200] * 5
+    assert perf_counter() - start < 0.6
+
+
+def test_async_requests_are_timed(async_api, user, dataset):
+    response = async_get('/api/recipes/', user)
+    queries = re.search(r'desc="(\d+) queries"', response['Server-Timing'])
+    assert int(queries[1]) > 0
+
+
+def asgi_get(url, user):
+    """Отправляет запрос через ASGIHandler, как сервер ASGI: в отличие от
+    AsyncClient, ответ отдаётся через send_response в цикле событий."""
+    token, _ = Token.objects.get_or_create(user=user)
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', b'testserver'),
+            (b'authorization', f'Token {token.key}'.encode()),
+        ],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    async_to_sync(ASGIHandler())(scope, receive, send)
+    return messages[0]['status'], b''.join(
+        message.get('body', b'') for message in messages[1:]
+    )
+
+
+@pytest.mark.parametrize('file_format', ('txt', 'csv', 'pdf'))
+def test_shopping_list_download_under_asgi(user, dataset, file_format):
+    status, content = asgi_get(
+        f'/api/recipes/download_shopping_cart/?file_format={file_format}',
+        user,
+    )
+    assert status == 200
+    if file_format == 'pdf':
+        assert content.startswith(b'%PDF')
+        return
+    name, unit = next(iter(expected_totals(user)))
+    assert name.encode() in content
+    assert unit.encode() in content
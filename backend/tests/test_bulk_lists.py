@@ -0,0 +1,114 @@
+import pytest
+
+from recipes.cart_totals import rebuild
+from recipes.models import (
+    Favourite,
+    Recipes,
+    Shopping_cart,
+    ShoppingCartTotal,
+)
+
+pytestmark = pytest.mark.django_db
+
+FAVORITE_URL = '/api/recipes/favorite/'
+SHOPPING_CART_URL = '/api/recipes/shopping_cart/'
+
+
+def totals(user):
+    return dict(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'ingredient_id', 'amount'
+    ))
+
+
+def test_bulk_favorite_reports_changed_ids(
+    user, user_client, dataset, django_capture_on_commit_callbacks,
+):
+    existing = Favourite.objects.filter(user=user).first().recipe_id
+    new = [
+        recipe.id for recipe in dataset['recipes']
+        if not Favourite.objects.filter(user=user, recipe=recipe).exists()
+    ][:3]
+    before = dict(Recipes.objects.filter(id__in=new).values_list(
+        'id', 'favourites_count'
+    ))
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.post(
+            FAVORITE_URL,
+            {'recipes': [*new, existing, new[0], 999999]},
+            format='json',
+        )
+    assert response.status_code == 200, response.data
+    assert response.data == {
+        'changed': sorted(new),
+        'unchanged': sorted([existing, 999999]),
+    }
+    assert Favourite.objects.filter(user=user, recipe_id__in=new).count() == 3
+    for recipe_id, count in Recipes.objects.filter(id__in=new).values_list(
+        'id', 'favourites_count'
+    ):
+        assert count == before[recipe_id] + 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.delete(
+            FAVORITE_URL, {'recipes': [*new, 999999]}, format='json'
+        )
+    assert response.data == {'changed': sorted(new), 'unchanged': [999999]}
+    assert not Favourite.objects.filter(user=user, recipe_id__in=new).exists()
+    assert dict(Recipes.objects.filter(id__in=new).values_list(
+        'id', 'favourites_count'
+    )) == before
+
+
+def test_bulk_shopping_cart_keeps_totals(user, user_client, dataset):
+    recipes = [
+        recipe.id for recipe in dataset['recipes']
+        if not Shopping_cart.objects.filter(user=user, recipe=recipe).exists()
+    ][:4]
+    response = user_client.post(
+        SHOPPING_CART_URL, {'recipes': recipes}, format='json'
+    )
+    assert response.data['changed'] == sorted(recipes)
+    incremental = totals(user)
+    rebuild([user.id])
+    assert totals(user) == incremental
+
+    response = user_client.delete(
+        SHOPPING_CART_URL, {'recipes': recipes[:2]}, format='json'
+    )
+    assert response.data['changed'] == sorted(recipes[:2])
+    incremental = totals(user)
+    rebuild([user.id])
+    assert totals(user) == incremental
+
+
+@pytest.mark.parametrize('count', (1, 20))
+def test_bulk_shopping_cart_query_budget(
+    user, user_client, dataset, django_assert_max_num_queries, count,
+):
+    Shopping_cart.objects.filter(user=user).delete()
+    recipes = [recipe.id for recipe in dataset['recipes'][:count]]
+    # Токен, рецепты, связи, вставка, количества, блокировка, итоги,
+    # вставка итогов, а также точки сохранения транзакций.
+    with django_assert_max_num_queries(12):
+        response = user_client.post(
+            SHOPPING_CART_URL, {'recipes': recipes}, format='json'
+        )
+    assert len(response.data['changed']) == count
+
+
+@pytest.mark.parametrize('payload', (
+    {},
+    {'recipes': []},
+    {'recipes': ['рецепт']},
+    {'recipes': [0]},
+))
+def test_bulk_rejects_invalid_payload(user_client, payload):
+    response = user_client.post(FAVORITE_URL, payload, format='json')
+    assert response.status_code == 400
+
+
+def test_bulk_requires_authentication(anon_client):
+    response = anon_client.post(
+        FAVORITE_URL, {'recipes': [1]}, format='json'
+    )
+    assert response.status_code == 401
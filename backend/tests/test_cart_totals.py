@@ -0,0 +1,126 @@
+import pytest
+from django.core.management import call_command
+
+from recipes.models import (
+    IngredientsInRecipe,
+    Shopping_cart,
+    ShoppingCartTotal,
+)
+from tests.test_query_budget import recipe_payload
+from tests.test_shopping_list import expected_totals
+
+pytestmark = pytest.mark.django_db
+
+
+def totals(user):
+    return {
+        (total.ingredient.name, total.ingredient.measurement_unit):
+            total.amount
+        for total in ShoppingCartTotal.objects.filter(
+            user=user
+        ).select_related('ingredient')
+    }
+
+
+def test_cart_add_and_remove_update_totals(user, user_client, dataset):
+    recipe = dataset['recipes'][1]
+    url = f'/api/recipes/{recipe.id}/shopping_cart/'
+    assert user_client.post(url).status_code == 201
+    assert totals(user) == expected_totals(user)
+    assert user_client.delete(url).status_code == 204
+    assert totals(user) == expected_totals(user)
+
+
+def test_recipe_update_changes_totals_of_every_cart(
+    user, superuser, superuser_client, dataset,
+):
+    recipe = dataset['recipes'][0]
+    superuser_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    payload = recipe_payload(dataset, ingredients_count=3)
+    response = superuser_client.patch(
+        f'/api/recipes/{recipe.id}/', payload, format='json'
+    )
+    assert response.status_code == 200, response.data
+    assert totals(user) == expected_totals(user)
+    assert totals(superuser) == expected_totals(superuser)
+
+
+def test_recipe_delete_removes_it_from_totals(
+    user, superuser_client, dataset,
+):
+    recipe = dataset['recipes'][0]
+    assert superuser_client.delete(
+        f'/api/recipes/{recipe.id}/'
+    ).status_code == 204
+    assert totals(user) == expected_totals(user)
+
+
+@pytest.fixture
+def admin_client(client, superuser):
+    client.force_login(superuser)
+    return client
+
+
+def test_admin_cart_changes_update_totals_and_counters(
+    user, admin_client, dataset, django_capture_on_commit_callbacks,
+):
+    recipe = dataset['recipes'][1]
+    with django_capture_on_commit_callbacks(execute=True):
+        response = admin_client.post('/admin/recipes/shopping_cart/add/', {
+            'user': user.id, 'recipe': recipe.id,
+        })
+    assert response.status_code == 302
+    assert totals(user) == expected_totals(user)
+    recipe.refresh_from_db()
+    assert recipe.shopping_cart_count == 1
+    links = Shopping_cart.objects.filter(user=user)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = admin_client.post('/admin/recipes/shopping_cart/', {
+            'action': 'delete_selected',
+            'post': 'yes',
+            '_selected_action': list(links.values_list('id', flat=True)),
+        })
+    assert response.status_code == 302
+    assert not links.exists()
+    assert totals(user) == {}
+    recipe.refresh_from_db()
+    assert recipe.shopping_cart_count == 0
+
+
+def test_admin_ingredient_changes_update_totals(user, admin_client, dataset):
+    row = IngredientsInRecipe.objects.filter(
+        recipe=dataset['recipes'][0]
+    ).first()
+    response = admin_client.post(
+        f'/admin/recipes/ingredientsinrecipe/{row.id}/change/', {
+            'recipe': row.recipe_id,
+            'ingredient': dataset['ingredients'][-1].id,
+            'amount': row.amount + 5,
+        }
+    )
+    assert response.status_code == 302
+    assert totals(user) == expected_totals(user)
+    response = admin_client.post(
+        f'/admin/recipes/ingredientsinrecipe/{row.id}/delete/',
+        {'post': 'yes'},
+    )
+    assert response.status_code == 302
+    assert totals(user) == expected_totals(user)
+
+
+def test_summary_endpoint(user, user_client, dataset):
+    response = user_client.get('/api/recipes/shopping_cart_summary/')
+    assert response.status_code == 200
+    assert {
+        (item['name'], item['measurement_unit']): item['amount']
+        for item in response.data
+    } == expected_totals(user)
+
+
+def test_reconcile_command_rebuilds_totals(user, dataset):
+    ShoppingCartTotal.objects.all().delete()
+    call_command('command_cart_totals')
+    assert totals(user) == expected_totals(user)
+    ShoppingCartTotal.objects.filter(user=user).update(amount=1)
+    call_command('command_cart_totals', users=[user.id])
+    assert totals(user) == expected_totals(user)
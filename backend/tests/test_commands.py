@@ -0,0 +1,125 @@
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F
+
+from recipes.management.commands.command_explain_queries import (
+    CANONICAL_REQUESTS,
+    cursor_query,
+)
+from recipes.models import (
+    Favourite,
+    Ingredients,
+    IngredientsInRecipe,
+    Recipes,
+    TagsInRecipe,
+)
+from users.models import Subscribe, User
+
+pytestmark = pytest.mark.django_db
+
+
+def scale_data(seed=7):
+    call_command(
+        'command_scale_data', seed=seed, users=30, recipes=120,
+        favourites_per_user=5, carts_per_user=2, subscriptions_per_user=4,
+        chunk_size=50, no_copy=True,
+    )
+
+
+@pytest.fixture
+def catalogue():
+    Ingredients.objects.bulk_create([
+        Ingredients(name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(40)
+    ])
+
+
+def test_scale_data_volumes(catalogue):
+    scale_data()
+    assert User.objects.filter(username__startswith='load').count() == 30
+    assert Recipes.objects.count() == 120
+    per_recipe = IngredientsInRecipe.objects.values('recipe').annotate(
+        total=Count('id')
+    ).values_list('total', flat=True)
+    assert len(per_recipe) == 120
+    assert min(per_recipe) >= 5 and max(per_recipe) <= 15
+    assert TagsInRecipe.objects.values('recipe').distinct().count() == 120
+    assert Favourite.objects.exists()
+    assert not Subscribe.objects.filter(user=F('author')).exists()
+
+
+def test_scale_data_is_deterministic(catalogue):
+    scale_data()
+    first = list(Favourite.objects.values_list('user_id', 'recipe_id'))
+    User.objects.filter(username__startswith='load').delete()
+    scale_data()
+    offset_user = User.objects.order_by('id').first().id - 1
+    offset_recipe = Recipes.objects.order_by('id').first().id - 1
+    second = [
+        (user_id - offset_user, recipe_id - offset_recipe)
+        for user_id, recipe_id
+        in Favourite.objects.values_list('user_id', 'recipe_id')
+    ]
+    assert sorted(second) == sorted(first)
+
+
+def test_scale_data_requires_ingredients():
+    with pytest.raises(CommandError):
+        scale_data()
+
+
+def test_explain_queries_replays_actions_without_writes(dataset):
+    favourites = Favourite.objects.count()
+    subscriptions = Subscribe.objects.count()
+    stdout, stderr = StringIO(), StringIO()
+    call_command(
+        'command_explain_queries', min_rows=0, stdout=stdout, stderr=stderr
+    )
+    output = stdout.getvalue()
+    for name, _, _ in CANONICAL_REQUESTS:
+        assert f'{name}: запросов к базе - ' in output
+    assert '[seq scan]' in output
+    assert not stderr.getvalue()
+    assert Favourite.objects.count() == favourites
+    assert Subscribe.objects.count() == subscriptions
+
+
+def test_explain_queries_runs_recipe_search(dataset):
+    stdout = StringIO()
+    call_command(
+        'command_explain_queries', min_rows=0, verbosity=2, stdout=stdout
+    )
+    output = stdout.getvalue()
+    start = output.index('recipes.list search:')
+    section = output[start:output.index('recipes.retrieve:', start)]
+    # Названия всех рецептов набора начинаются со слова «Рецепт».
+    assert 'Рецепт' in section
+
+
+@pytest.mark.parametrize('sql', (
+    'DECLARE "_django_curs_1_sync_1" NO SCROLL CURSOR WITHOUT HOLD FOR '
+    'SELECT "id" FROM "recipes_recipes"',
+    'declare c cursor for\nSELECT "id" FROM "recipes_recipes"',
+    'SELECT "id" FROM "recipes_recipes"',
+))
+def test_explain_queries_unwraps_server_side_cursors(sql):
+    assert cursor_query(sql) == 'SELECT "id" FROM "recipes_recipes"'
+
+
+def test_explain_queries_unknown_user(dataset):
+    with pytest.raises(CommandError):
+        call_command('command_explain_queries', user='nobody')
+
+
+def test_benchmark_reports_throughput(live_server, dataset):
+    stdout = StringIO()
+    call_command(
+        'command_benchmark', url=live_server.url, requests=20,
+        concurrency=4, paths=['/api/tags/', '/api/recipes/'], stdout=stdout,
+    )
+    name, report = stdout.getvalue().strip().split(': ', 1)
+    assert name == live_server.url
+    assert 'запросов/с, p50 ' in report
+    assert report.endswith('ошибок 0 из 20')
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Favourite, Recipes
+
+pytestmark = pytest.mark.django_db
+
+
+def counters(recipe):
+    recipe.refresh_from_db()
+    return recipe.favourites_count, recipe.shopping_cart_count
+
+
+def toggle(client, recipe, action, method, capture):
+    with capture(execute=True):
+        response = getattr(client, method)(
+            f'/api/recipes/{recipe.id}/{action}/'
+        )
+    assert response.status_code in (201, 204), response.data
+
+
+def test_toggles_update_counters(
+    user_client, superuser_client, dataset,
+    django_capture_on_commit_callbacks,
+):
+    recipe = dataset['recipes'][1]
+    before_favourites, before_cart = counters(recipe)
+    for client in (user_client, superuser_client):
+        toggle(client, recipe, 'favorite', 'post',
+               django_capture_on_commit_callbacks)
+    toggle(superuser_client, recipe, 'shopping_cart', 'post',
+           django_capture_on_commit_callbacks)
+    assert counters(recipe) == (before_favourites + 2, before_cart + 1)
+    toggle(user_client, recipe, 'favorite', 'delete',
+           django_capture_on_commit_callbacks)
+    assert counters(recipe) == (before_favourites + 1, before_cart + 1)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_batched_counters_flush_once_per_interval(
+    user_client, superuser_client, dataset, settings,
+    django_capture_on_commit_callbacks,
+):
+    settings.RECIPE_COUNTERS_FLUSH_INTERVAL = 1
+    recipe = dataset['recipes'][1]
+    before_favourites, _ = counters(recipe)
+    toggle(user_client, recipe, 'favorite', 'post',
+           django_capture_on_commit_callbacks)
+    assert counters(recipe)[0] == before_favourites + 1
+    toggle(superuser_client, recipe, 'favorite', 'post',
+           django_capture_on_commit_callbacks)
+    assert counters(recipe)[0] == before_favourites + 1
+    deadline = time.monotonic() + 5
+    while (counters(recipe)[0] != before_favourites + 2
+           and time.monotonic() < deadline):
+        time.sleep(0.1)
+    assert counters(recipe)[0] == before_favourites + 2
+
+
+def test_recount_matches_tables(dataset):
+    Recipes.objects.update(favourites_count=0, shopping_cart_count=0)
+    call_command('command_recipe_counters')
+    for recipe in Recipes.objects.all():
+        assert recipe.favourites_count == recipe.favourite.count()
+        assert recipe.shopping_cart_count == recipe.shopping_cart.count()
+
+
+def test_popular_ordering(anon_client, superuser, dataset):
+    popular = dataset['recipes'][4]
+    Favourite.objects.create(user=superuser, recipe=popular)
+    call_command('command_recipe_counters')
+    response = anon_client.get('/api/recipes/?ordering=popular&limit=100')
+    ids = [item['id'] for item in response.data['results']]
+    assert ids[0] == popular.id
+    expected = Recipes.objects.order_by(
+        '-favourites_count', '-shopping_cart_count', '-id'
+    ).values_list('id', flat=True)
+    assert ids == list(expected)
@@ -0,0 +1,54 @@
+import pytest
+
+from recipes.models import Recipes, Tag
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tagged_recipes(dataset):
+    """Рецепты с разными наборами тегов: без тегов, с одним и с двумя."""
+    breakfast, lunch, dinner = dataset['tags']
+    both, only_breakfast, untagged = dataset['recipes'][:3]
+    for recipe in (both, only_breakfast, untagged):
+        recipe.tags.clear()
+    both.tags.set([breakfast, lunch])
+    only_breakfast.tags.set([breakfast])
+    return both, only_breakfast, untagged
+
+
+def recipe_ids(client, query):
+    response = client.get(f'/api/recipes/?limit=1000&{query}')
+    assert response.status_code == 200
+    ids = [item['id'] for item in response.data['results']]
+    assert response.data['count'] == len(ids) == len(set(ids))
+    return ids
+
+
+def test_tags_any_of_returns_each_recipe_once(anon_client, tagged_recipes):
+    both, only_breakfast, untagged = tagged_recipes
+    ids = recipe_ids(anon_client, 'tags=breakfast&tags=lunch')
+    assert both.id in ids and only_breakfast.id in ids
+    assert untagged.id not in ids
+    assert ids == list(
+        Recipes.objects.filter(tags__slug__in=['breakfast', 'lunch'])
+        .distinct().values_list('id', flat=True)
+    )
+
+
+def test_tags_all_of(anon_client, tagged_recipes):
+    both, only_breakfast, _ = tagged_recipes
+    ids = recipe_ids(anon_client, 'tags=breakfast&tags=lunch&tags_match=all')
+    assert ids == [both.id]
+    ids = recipe_ids(anon_client, 'tags=breakfast&tags_match=all')
+    assert both.id in ids and only_breakfast.id in ids
+
+
+def test_tags_filter_does_not_join(
+    anon_client, tagged_recipes, django_assert_max_num_queries,
+):
+    with django_assert_max_num_queries(6) as captured:
+        anon_client.get('/api/recipes/?tags=breakfast&tags=lunch')
+    statements = [query['sql'] for query in captured.captured_queries]
+    assert not any('DISTINCT' in sql for sql in statements)
+    assert Tag.objects.count() == 3
@@ -0,0 +1,85 @@
+import base64
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from PIL import Image
+
+from recipes.models import Recipes
+from tests.test_query_budget import recipe_payload
+
+pytestmark = pytest.mark.django_db
+
+
+def png(width, height):
+    output = BytesIO()
+    Image.new('RGB', (width, height), '#E26C2D').save(output, format='PNG')
+    return output.getvalue()
+
+
+def create_recipe(client, dataset, capture):
+    payload = recipe_payload(dataset)
+    payload['image'] = (
+        'data:image/png;base64,' + base64.b64encode(png(1600, 800)).decode()
+    )
+    with capture(execute=True):
+        response = client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 201, response.data
+    return Recipes.objects.get(pk=response.data['id'])
+
+
+def test_variants_built_after_commit(
+    user_client, dataset, settings, django_capture_on_commit_callbacks,
+):
+    recipe = create_recipe(
+        user_client, dataset, django_capture_on_commit_callbacks
+    )
+    variants = recipe.image_variants
+    assert variants['source'] == recipe.image.name
+    assert set(variants['sizes']) == set(settings.RECIPE_IMAGE_SIZES)
+    for size_name, formats in variants['sizes'].items():
+        assert set(formats) == set(settings.RECIPE_IMAGE_FORMATS)
+        with default_storage.open(formats['webp']) as file:
+            image = Image.open(file)
+            assert image.format == 'WEBP'
+            assert image.size == (
+                settings.RECIPE_IMAGE_SIZES[size_name],
+                settings.RECIPE_IMAGE_SIZES[size_name] // 2,
+            )
+
+
+def test_serializers_expose_variant_urls(
+    user_client, dataset, django_capture_on_commit_callbacks,
+):
+    recipe = create_recipe(
+        user_client, dataset, django_capture_on_commit_callbacks
+    )
+    detail = user_client.get(f'/api/recipes/{recipe.id}/').data
+    assert set(detail['image_variants']) == {'small', 'medium', 'large'}
+    assert detail['image_variants']['small']['webp'].startswith(
+        'http://testserver/media/recipes/variants/'
+    )
+    response = user_client.post(f'/api/recipes/{recipe.id}/favorite/')
+    assert set(response.data['image_variants']) == {'small', 'medium'}
+
+
+def test_pending_image_falls_back_to_original(user_client, dataset):
+    response = user_client.post(
+        '/api/recipes/', recipe_payload(dataset), format='json'
+    )
+    assert response.status_code == 201
+    assert response.data['image_variants'] == {}
+    assert response.data['image']
+
+
+def test_command_builds_pending_variants(dataset):
+    recipe = dataset['recipes'][0]
+    default_storage.save(recipe.image.name, ContentFile(png(50, 50)))
+    call_command('command_image_variants')
+    recipe.refresh_from_db()
+    assert recipe.image_variants['source'] == recipe.image.name
+    assert default_storage.exists(
+        recipe.image_variants['sizes']['small']['jpeg']
+    )
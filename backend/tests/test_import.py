@@ -0,0 +1,136 @@
+import json
+
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Recipes
+from tests.conftest import IMAGE
+
+pytestmark = pytest.mark.django_db
+
+IMPORT_URL = '/api/recipes/import/'
+
+
+def item(dataset, number, **overrides):
+    data = {
+        'name': f'Импорт {number}',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': [dataset['tags'][number % 3].id],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': number + 1}
+            for ingredient in dataset['ingredients'][number:number + 5]
+        ],
+    }
+    data.update(overrides)
+    return data
+
+
+def assert_imported(dataset, number, recipe_id, author):
+    recipe = Recipes.objects.get(pk=recipe_id)
+    assert recipe.name == f'Импорт {number}'
+    assert recipe.author == author
+    assert list(recipe.tags.all()) == [dataset['tags'][number % 3]]
+    amounts = {
+        row.ingredient_id: row.amount
+        for row in recipe.ingredientsinrecipe_set.all()
+    }
+    assert amounts == {
+        ingredient.id: number + 1
+        for ingredient in dataset['ingredients'][number:number + 5]
+    }
+
+
+def test_import_reports_per_item(user, user_client, dataset):
+    items = [
+        item(dataset, 0),
+        item(dataset, 1, tags=[999999]),
+        item(dataset, 2),
+        item(dataset, 3, ingredients=[
+            {'id': dataset['ingredients'][0].id, 'amount': 1},
+            {'id': dataset['ingredients'][0].id, 'amount': 2},
+        ]),
+        'не рецепт',
+    ]
+    response = user_client.post(IMPORT_URL, items, format='json')
+    assert response.status_code == 200
+    assert response.data['created'] == 2
+    assert response.data['failed'] == 3
+    results = response.data['results']
+    assert [entry['index'] for entry in results] == [0, 1, 2, 3, 4]
+    assert 'tags' in results[1]['errors']
+    assert 'ingredients' in results[3]['errors']
+    assert 'errors' in results[4]
+    assert_imported(dataset, 0, results[0]['id'], user)
+    assert_imported(dataset, 2, results[2]['id'], user)
+
+
+def test_import_query_count_does_not_grow(
+    user_client, dataset, django_assert_max_num_queries,
+):
+    items = [item(dataset, number) for number in range(40)]
+    with django_assert_max_num_queries(12):
+        response = user_client.post(IMPORT_URL, items, format='json')
+    assert response.data['created'] == 40
+
+
+def test_import_ndjson(user, user_client, dataset):
+    body = '\n'.join(
+        json.dumps(item(dataset, number)) for number in range(3)
+    )
+    response = user_client.post(
+        IMPORT_URL, body, content_type='application/x-ndjson'
+    )
+    assert response.status_code == 200
+    assert response.data['created'] == 3
+    for number, entry in enumerate(response.data['results']):
+        assert_imported(dataset, number, entry['id'], user)
+
+
+def test_import_rejects_malformed_ndjson(user_client, dataset):
+    response = user_client.post(
+        IMPORT_URL, '{"name": 1}\n{oops', content_type='application/x-ndjson'
+    )
+    assert response.status_code == 400
+
+
+def test_import_limits(user_client, anon_client, dataset, settings):
+    assert anon_client.post(
+        IMPORT_URL, [item(dataset, 0)], format='json'
+    ).status_code == 401
+    settings.RECIPES_IMPORT_MAX_ITEMS = 1
+    response = user_client.post(
+        IMPORT_URL, [item(dataset, 0), item(dataset, 1)], format='json'
+    )
+    assert response.status_code == 400
+    response = user_client.post(IMPORT_URL, item(dataset, 0), format='json')
+    assert response.status_code == 400
+
+
+def test_command_imports_file(user, dataset, tmp_path, capsys):
+    path = tmp_path / 'recipes.ndjson'
+    path.write_text('\n'.join(
+        json.dumps(item(dataset, number), ensure_ascii=False)
+        for number in range(2)
+    ) + '\n' + json.dumps(item(dataset, 2, cooking_time=0)), encoding='UTF-8')
+    call_command('command_import_recipes', str(path), author=user.username)
+    output = capsys.readouterr()
+    assert 'Импортировано рецептов: 2, с ошибками: 1.' in output.out
+    assert 'cooking_time' in output.err
+    assert Recipes.objects.filter(
+        author=user, name__startswith='Импорт'
+    ).count() == 2
+
+
+def test_oversized_import_rejected_before_parsing(
+    user_client, dataset, settings, django_assert_max_num_queries,
+):
+    settings.RECIPES_IMPORT_MAX_BODY = 1024
+    body = json.dumps([item(dataset, number) for number in range(20)])
+    with django_assert_max_num_queries(1):
+        response = user_client.post(
+            IMPORT_URL, body, content_type='application/json'
+        )
+    assert response.status_code == 413
+    assert not Recipes.objects.filter(name__startswith='Импорт').exists()
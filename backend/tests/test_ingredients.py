@@ -0,0 +1,62 @@
+import pytest
+
+from recipes.models import Ingredients
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def catalogue():
+    Ingredients.objects.bulk_create([
+        Ingredients(name=name, measurement_unit='г')
+        for name in (
+            'Ёжевика', 'ежевичный джем', 'Яблоко', 'яблочный сок',
+            'ЯБЛОЧНОЕ пюре', 'Apple jam',
+        )
+    ])
+
+
+def names(response):
+    assert response.status_code == 200
+    return sorted(item['name'] for item in response.data)
+
+
+@pytest.mark.parametrize('prefix', ('ябл', 'Ябл', 'ЯБЛ', ' ябЛ'))
+def test_prefix_search_folds_cyrillic_case(anon_client, catalogue, prefix):
+    response = anon_client.get('/api/ingredients/', {'name': prefix})
+    assert names(response) == sorted(
+        ['Яблоко', 'яблочный сок', 'ЯБЛОЧНОЕ пюре']
+    )
+
+
+def test_prefix_search_treats_yo_as_ye(anon_client, catalogue):
+    for prefix in ('еж', 'ЁЖ'):
+        response = anon_client.get('/api/ingredients/', {'name': prefix})
+        assert names(response) == sorted(['ежевичный джем', 'Ёжевика'])
+
+
+def test_prefix_search_limits_and_min_length(
+    anon_client, catalogue, settings,
+):
+    response = anon_client.get('/api/ingredients/', {'name': 'я'})
+    assert response.data == []
+    settings.INGREDIENTS_SEARCH_LIMIT = 2
+    response = anon_client.get('/api/ingredients/', {'name': 'ябл'})
+    assert len(response.data) == 2
+    settings.INGREDIENTS_SEARCH_MIN_LENGTH = 3
+    response = anon_client.get('/api/ingredients/', {'name': 'яб'})
+    assert response.data == []
+
+
+def test_prefix_search_is_cached_and_invalidated(
+    anon_client, catalogue, django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    anon_client.get('/api/ingredients/', {'name': 'app'})
+    with django_assert_num_queries(0):
+        response = anon_client.get('/api/ingredients/', {'name': 'APP'})
+    assert names(response) == ['Apple jam']
+    with django_capture_on_commit_callbacks(execute=True):
+        Ingredients.objects.create(name='Apple pie', measurement_unit='шт')
+    response = anon_client.get('/api/ingredients/', {'name': 'app'})
+    assert names(response) == ['Apple jam', 'Apple pie']
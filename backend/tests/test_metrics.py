@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from foodgram.metrics import get_registry
+from recipes.views import TagsViewSet
+
+pytestmark = pytest.mark.django_db
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def sample(name, registry=REGISTRY, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_request_metrics_per_action(user_client, dataset):
+    labels = {'action': 'users.subscriptions', 'method': 'GET'}
+    requests = sample('foodgram_requests_total', status='2xx', **labels)
+    latency = sample('foodgram_request_duration_seconds_count', **labels)
+    queries = sample(
+        'foodgram_db_queries_count', action='users.subscriptions'
+    )
+    user_client.get('/api/users/subscriptions/')
+    assert sample(
+        'foodgram_requests_total', status='2xx', **labels
+    ) == requests + 1
+    assert sample(
+        'foodgram_request_duration_seconds_count', **labels
+    ) == latency + 1
+    assert sample(
+        'foodgram_db_queries_count', action='users.subscriptions'
+    ) == queries + 1
+
+
+def test_error_metrics(dataset, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(TagsViewSet, 'list', fail)
+    labels = {'action': 'tags.list', 'method': 'GET'}
+    errors = sample('foodgram_request_errors_total', **labels)
+    client = APIClient(raise_request_exception=False)
+    assert client.get('/api/tags/').status_code == 500
+    assert sample('foodgram_request_errors_total', **labels) == errors + 1
+    unmatched = sample(
+        'foodgram_requests_total',
+        action='unmatched', method='GET', status='4xx',
+    )
+    assert client.get('/api/missing/').status_code == 404
+    assert sample(
+        'foodgram_requests_total',
+        action='unmatched', method='GET', status='4xx',
+    ) == unmatched + 1
+
+
+def test_cache_lookup_metrics(anon_client, dataset):
+    hits = sample('foodgram_cache_lookups_total', cache='tags', result='hit')
+    misses = sample(
+        'foodgram_cache_lookups_total', cache='tags', result='miss'
+    )
+    anon_client.get('/api/tags/')
+    anon_client.get('/api/tags/')
+    assert sample(
+        'foodgram_cache_lookups_total', cache='tags', result='miss'
+    ) == misses + 1
+    assert sample(
+        'foodgram_cache_lookups_total', cache='tags', result='hit'
+    ) == hits + 1
+
+
+def test_metrics_endpoint(anon_client, dataset):
+    anon_client.get('/api/tags/')
+    response = anon_client.get('/metrics')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    assert b'foodgram_request_duration_seconds_bucket{' in response.content
+
+
+def test_metrics_aggregate_worker_processes(tmp_path, monkeypatch):
+    env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)}
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, '-c',
+             'from foodgram.metrics import observe_cache; '
+             'observe_cache("recipes-response", "hit")'],
+            cwd=BACKEND_DIR, env=env, check=True,
+        )
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    assert sample(
+        'foodgram_cache_lookups_total', get_registry(),
+        cache='recipes-response', result='hit',
+    ) == 2
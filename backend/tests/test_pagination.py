@@ -0,0 +1,61 @@
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+
+def walk(client, url):
+    """Проходит все страницы курсорной выдачи, возвращая id и страницы."""
+    ids, pages = [], 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'count' not in response.data
+        ids += [item['id'] for item in response.data['results']]
+        url = response.data['next']
+        pages += 1
+    return ids, pages
+
+
+@pytest.mark.parametrize('query', (
+    '',
+    '&tags=breakfast&tags=lunch',
+    '&is_favorited=1',
+    '&is_in_shopping_cart=1',
+))
+def test_recipes_cursor_matches_page_mode(user_client, dataset, query):
+    expected = [
+        item['id'] for item in
+        user_client.get(f'/api/recipes/?limit=1000{query}').data['results']
+    ]
+    ids, pages = walk(user_client, f'/api/recipes/?cursor=&limit=7{query}')
+    assert ids == expected
+    assert ids == sorted(ids, reverse=True)
+    assert pages == len(expected) // 7 + 1
+
+
+def test_recipes_cursor_rejects_popular_ordering(user_client, dataset):
+    response = user_client.get('/api/recipes/?cursor=&ordering=popular')
+    assert response.status_code == 400
+    response = user_client.get('/api/recipes/?page=1&ordering=popular')
+    assert response.status_code == 200
+
+
+def test_recipes_deep_cursor_page_has_constant_budget(
+    user_client, django_assert_max_num_queries, dataset,
+):
+    response = user_client.get('/api/recipes/?cursor=&limit=5')
+    while response.data['next']:
+        with django_assert_max_num_queries(5) as captured:
+            response = user_client.get(response.data['next'])
+        assert not any(
+            'COUNT(' in query['sql'] for query in captured.captured_queries
+        )
+
+
+def test_subscriptions_cursor(user_client, dataset):
+    expected = [
+        item['id'] for item in
+        user_client.get('/api/users/subscriptions/?limit=100').data['results']
+    ]
+    ids, _ = walk(user_client, '/api/users/subscriptions/?cursor=&limit=2')
+    assert ids == expected
@@ -0,0 +1,206 @@
+"""Бюджеты SQL-запросов и времени ответа для эндпоинтов API.
+
+Бюджет запросов не зависит от размера страницы и объёма данных: N+1 в
+сериализаторах приводит к падению теста, а не к деградации в продакшене.
+"""
+import time
+
+import pytest
+
+from tests.conftest import IMAGE
+
+MAX_SECONDS = 1.0
+
+pytestmark = pytest.mark.django_db
+
+CLIENTS = ('anon_client', 'user_client', 'superuser_client')
+AUTH_CLIENTS = ('user_client', 'superuser_client')
+
+# Бюджеты учитывают запрос токена при аутентификации.
+READ_BUDGETS = (
+    ('/api/recipes/', 6),
+    ('/api/recipes/?limit=50', 6),
+    ('/api/recipes/?page=3&limit=10', 6),
+    ('/api/recipes/?tags=breakfast&tags=lunch', 7),
+    ('/api/recipes/?author={author}', 7),
+    ('/api/recipes/?is_favorited=1', 6),
+    ('/api/recipes/?is_in_shopping_cart=1', 6),
+    ('/api/recipes/?name=Рецепт', 6),
+    ('/api/recipes/{recipe}/', 5),
+    ('/api/tags/', 2),
+    ('/api/tags/{tag}/', 2),
+    ('/api/ingredients/', 2),
+    ('/api/ingredients/?name=ингр', 2),
+    ('/api/ingredients/{ingredient}/', 2),
+    ('/api/users/', 3),
+    ('/api/users/?limit=50', 3),
+)
+
+AUTH_READ_BUDGETS = (
+    ('/api/users/me/', 2),
+    ('/api/users/{author}/', 2),
+    ('/api/users/subscriptions/', 4),
+    ('/api/users/subscriptions/?recipes_limit=2', 4),
+    ('/api/users/subscriptions/?limit=50&recipes_limit=3', 4),
+    ('/api/recipes/download_shopping_cart/', 2),
+)
+
+
+def request_within_budget(
+    django_assert_max_num_queries, client, method, url, max_queries,
+    data=None,
+):
+    """Выполняет запрос, проверяя число SQL-запросов и время ответа."""
+    with django_assert_max_num_queries(max_queries):
+        started = time.perf_counter()
+        response = getattr(client, method)(url, data=data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+    assert elapsed < MAX_SECONDS, (
+        f'{method.upper()} {url} занял {elapsed:.3f} с'
+    )
+    return response
+
+
+def format_url(url, dataset):
+    return url.format(
+        recipe=dataset['recipes'][0].id,
+        author=dataset['authors'][0].id,
+        tag=dataset['tags'][0].id,
+        ingredient=dataset['ingredients'][0].id,
+    )
+
+
+def recipe_payload(dataset, ingredients_count=8):
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание нового рецепта',
+        'cooking_time': 15,
+        'image': IMAGE,
+        'tags': [tag.id for tag in dataset['tags']],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in dataset['ingredients'][:ingredients_count]
+        ],
+    }
+
+
+@pytest.mark.parametrize('client_name', CLIENTS)
+@pytest.mark.parametrize('url, max_queries', READ_BUDGETS)
+def test_read_endpoints_budget(
+    request, django_assert_max_num_queries, dataset, client_name, url,
+    max_queries,
+):
+    client = request.getfixturevalue(client_name)
+    response = request_within_budget(
+        django_assert_max_num_queries, client, 'get',
+        format_url(url, dataset), max_queries,
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('client_name', AUTH_CLIENTS)
+@pytest.mark.parametrize('url, max_queries', AUTH_READ_BUDGETS)
+def test_authenticated_read_endpoints_budget(
+    request, django_assert_max_num_queries, dataset, client_name, url,
+    max_queries,
+):
+    client = request.getfixturevalue(client_name)
+    response = request_within_budget(
+        django_assert_max_num_queries, client, 'get',
+        format_url(url, dataset), max_queries,
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('ingredients_count', (1, 8, 40))
+@pytest.mark.parametrize('client_name', AUTH_CLIENTS)
+def test_recipe_create_budget(
+    request, django_assert_max_num_queries, dataset, client_name,
+    ingredients_count,
+):
+    client = request.getfixturevalue(client_name)
+    response = request_within_budget(
+        django_assert_max_num_queries, client, 'post', '/api/recipes/',
+        12, data=recipe_payload(dataset, ingredients_count),
+    )
+    assert response.status_code == 201, response.data
+
+
+def test_recipe_update_budget(
+    user, user_client, django_assert_max_num_queries, dataset,
+):
+    recipe = dataset['recipes'][0]
+    recipe.author = user
+    recipe.save()
+    response = request_within_budget(
+        django_assert_max_num_queries, user_client, 'patch',
+        f'/api/recipes/{recipe.id}/', 21, data=recipe_payload(dataset),
+    )
+    assert response.status_code == 200, response.data
+
+
+def test_superuser_update_foreign_recipe_budget(
+    superuser_client, django_assert_max_num_queries, dataset,
+):
+    recipe = dataset['recipes'][0]
+    response = request_within_budget(
+        django_assert_max_num_queries, superuser_client, 'patch',
+        f'/api/recipes/{recipe.id}/', 21, data=recipe_payload(dataset),
+    )
+    assert response.status_code == 200, response.data
+
+
+# Список покупок дополнительно блокирует рецепт и обновляет итоги по
+# ингредиентам.
+@pytest.mark.parametrize('action, max_queries', (
+    ('favorite', 5),
+    ('shopping_cart', 10),
+))
+def test_recipe_relation_toggle_budget(
+    user_client, django_assert_max_num_queries, dataset, action,
+    max_queries,
+):
+    url = f'/api/recipes/{dataset["recipes"][1].id}/{action}/'
+    response = request_within_budget(
+        django_assert_max_num_queries, user_client, 'post', url, max_queries,
+    )
+    assert response.status_code == 201, response.data
+    response = request_within_budget(
+        django_assert_max_num_queries, user_client, 'delete', url,
+        max_queries,
+    )
+    assert response.status_code == 204
+
+
+def test_subscribe_toggle_budget(
+    user_client, django_assert_max_num_queries, dataset,
+):
+    url = f'/api/users/{dataset["authors"][1].id}/subscribe/'
+    response = request_within_budget(
+        django_assert_max_num_queries, user_client, 'post', url, 5,
+    )
+    assert response.status_code == 201, response.data
+    response = request_within_budget(
+        django_assert_max_num_queries, user_client, 'delete', url, 2,
+    )
+    assert response.status_code == 204
+
+
+@pytest.mark.parametrize('url', (
+    '/api/recipes/{recipe}/favorite/',
+    '/api/recipes/{recipe}/shopping_cart/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/users/subscriptions/',
+    '/api/users/{author}/subscribe/',
+))
+def test_anonymous_writes_rejected_without_queries(
+    anon_client, django_assert_max_num_queries, dataset, url,
+):
+    method = 'get' if 'download' in url or 'subscriptions' in url else 'post'
+    response = request_within_budget(
+        django_assert_max_num_queries, anon_client, method,
+        format_url(url, dataset), 0,
+    )
+    assert response.status_code == 401
@@ -0,0 +1,149 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes import counters
+from recipes.models import IngredientsInRecipe, Recipes, ShoppingCartTotal
+from recipes.serializers import RecipesCreateSerializer
+from tests.test_query_budget import recipe_payload
+from tests.test_shopping_list import expected_totals
+
+pytestmark = pytest.mark.django_db
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def writes(queries):
+    return [
+        query['sql'] for query in queries
+        if query['sql'].startswith(WRITES)
+    ]
+
+
+@pytest.fixture
+def own_recipe(user, dataset):
+    recipe = dataset['recipes'][0]
+    recipe.author = user
+    recipe.save()
+    return recipe
+
+
+def patch(client, recipe, data):
+    with CaptureQueriesContext(connection) as context:
+        response = client.patch(
+            f'/api/recipes/{recipe.id}/', data, format='json'
+        )
+    assert response.status_code == 200, response.data
+    return response, writes(context.captured_queries)
+
+
+def test_text_patch_touches_only_recipe_row(user_client, own_recipe):
+    response, queries = patch(
+        user_client, own_recipe, {'text': 'Исправленное описание'}
+    )
+    assert response.data['text'] == 'Исправленное описание'
+    assert len(queries) == 1
+    assert queries[0].startswith('UPDATE "recipes_recipes"')
+    assert len(response.data['ingredients']) == 8
+
+
+def test_unchanged_composition_is_not_rewritten(user_client, own_recipe):
+    rows = own_recipe.ingredientsinrecipe_set.all()
+    data = {
+        'tags': [tag.id for tag in own_recipe.tags.all()],
+        'ingredients': [
+            {'id': row.ingredient_id, 'amount': row.amount} for row in rows
+        ],
+    }
+    _, queries = patch(user_client, own_recipe, data)
+    assert queries == []
+
+
+def test_ingredient_diff_keeps_unchanged_rows(
+    user, user_client, own_recipe, dataset,
+):
+    rows = list(own_recipe.ingredientsinrecipe_set.order_by('id'))
+    kept, changed, removed = rows[0], rows[1], rows[2:]
+    added = dataset['ingredients'][-1]
+    user_client.post(f'/api/recipes/{own_recipe.id}/shopping_cart/')
+    data = {'ingredients': [
+        {'id': kept.ingredient_id, 'amount': kept.amount},
+        {'id': changed.ingredient_id, 'amount': changed.amount + 5},
+        {'id': added.id, 'amount': 7},
+    ]}
+    response, _ = patch(user_client, own_recipe, data)
+    current = {
+        row.ingredient_id: row
+        for row in IngredientsInRecipe.objects.filter(recipe=own_recipe)
+    }
+    assert set(current) == {kept.ingredient_id, changed.ingredient_id,
+                            added.id}
+    assert current[kept.ingredient_id].id == kept.id
+    assert current[changed.ingredient_id].id == changed.id
+    assert current[changed.ingredient_id].amount == changed.amount + 5
+    assert not IngredientsInRecipe.objects.filter(
+        id__in=[row.id for row in removed]
+    ).exists()
+    totals = {
+        (total.ingredient.name, total.ingredient.measurement_unit):
+            total.amount
+        for total in ShoppingCartTotal.objects.filter(
+            user=user
+        ).select_related('ingredient')
+    }
+    assert totals == expected_totals(user)
+    assert len(response.data['ingredients']) == 3
+
+
+def test_tags_diff(user_client, own_recipe, dataset):
+    tags = dataset['tags']
+    patch(user_client, own_recipe, {'tags': [tags[2].id]})
+    assert [tag.id for tag in own_recipe.tags.all()] == [tags[2].id]
+
+
+def test_partial_update_validates_given_fields(user_client, own_recipe):
+    response = user_client.patch(
+        f'/api/recipes/{own_recipe.id}/', {'ingredients': []}, format='json'
+    )
+    assert response.status_code == 400
+
+
+def test_put_requires_full_payload(user_client, own_recipe, dataset):
+    response = user_client.put(
+        f'/api/recipes/{own_recipe.id}/', {'text': 'Только текст'},
+        format='json',
+    )
+    assert response.status_code == 400
+    payload = recipe_payload(dataset, ingredients_count=2)
+    response = user_client.put(
+        f'/api/recipes/{own_recipe.id}/', payload, format='json'
+    )
+    assert response.status_code == 200
+    assert len(response.data['ingredients']) == 2
+
+
+def test_patch_keeps_counters_and_variants_written_meanwhile(
+    user_client, own_recipe, monkeypatch,
+):
+    recipe = Recipes.objects.filter(pk=own_recipe.pk)
+    expected = recipe.values('favourites_count', 'shopping_cart_count').get()
+    assert expected['favourites_count'] > 0
+    recipe.update(favourites_count=0, shopping_cart_count=0)
+    variants = {'source': 'recipes/image.png', 'sizes': {}}
+    update = RecipesCreateSerializer.update
+
+    def update_after_writes(self, instance, validated_data):
+        # Пока запрос идёт, счётчики пересчитаны, а копии построены.
+        counters.recount()
+        recipe.update(image_variants=variants)
+        return update(self, instance, validated_data)
+
+    monkeypatch.setattr(
+        RecipesCreateSerializer, 'update', update_after_writes
+    )
+    patch(user_client, own_recipe, {'text': 'Исправленное описание'})
+    saved = recipe.get()
+    assert saved.text == 'Исправленное описание'
+    assert saved.favourites_count == expected['favourites_count']
+    assert saved.shopping_cart_count == expected['shopping_cart_count']
+    assert saved.image_variants == variants
@@ -0,0 +1,43 @@
+import pytest
+
+from tests.test_query_budget import recipe_payload
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('change', (
+    lambda payload, dataset: payload['ingredients'].append(
+        {'id': 999999, 'amount': 1}
+    ),
+    lambda payload, dataset: payload['ingredients'].append(
+        dict(payload['ingredients'][0])
+    ),
+    lambda payload, dataset: payload.update(ingredients=[]),
+    lambda payload, dataset: payload['tags'].append(999999),
+    lambda payload, dataset: payload['tags'].append(payload['tags'][0]),
+    lambda payload, dataset: payload.update(tags=[]),
+    lambda payload, dataset: payload['ingredients'][0].update(amount=0),
+))
+def test_invalid_recipe_rejected(
+    user_client, dataset, django_assert_max_num_queries, change,
+):
+    payload = recipe_payload(dataset)
+    change(payload, dataset)
+    with django_assert_max_num_queries(3):
+        response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 400
+
+
+def test_tags_and_ingredients_saved(user_client, dataset):
+    payload = recipe_payload(dataset, ingredients_count=3)
+    payload['tags'] = [dataset['tags'][2].id, dataset['tags'][0].id]
+    response = user_client.post('/api/recipes/', payload, format='json')
+    assert response.status_code == 201
+    assert {tag['id'] for tag in response.data['tags']} == set(
+        payload['tags']
+    )
+    assert sorted(
+        (item['id'], item['amount']) for item in response.data['ingredients']
+    ) == sorted(
+        (item['id'], item['amount']) for item in payload['ingredients']
+    )
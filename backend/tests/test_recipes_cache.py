@@ -0,0 +1,119 @@
+import pytest
+from django.core.cache import cache
+
+from recipes.models import Recipes
+
+pytestmark = pytest.mark.django_db
+
+LIST_URL = '/api/recipes/'
+
+
+def test_anonymous_list_is_cached_by_normalized_params(
+    anon_client, dataset, django_assert_num_queries,
+):
+    tags = dataset['tags']
+    first = anon_client.get(
+        LIST_URL, {'tags': [tags[0].slug, tags[1].slug], 'page': 1}
+    )
+    assert first.status_code == 200
+    with django_assert_num_queries(0):
+        second = anon_client.get(
+            LIST_URL, {'tags': [tags[1].slug, tags[0].slug, tags[0].slug]}
+        )
+    assert second.data == first.data
+
+
+def test_authenticated_requests_bypass_cache(
+    anon_client, user_client, dataset,
+):
+    anon_client.get(LIST_URL)
+    response = user_client.get(LIST_URL)
+    assert any(item['is_favorited'] for item in response.data['results'])
+
+
+def test_recipe_change_invalidates_list_and_detail(
+    anon_client, dataset, django_capture_on_commit_callbacks,
+):
+    recipe = Recipes.objects.first()
+    detail_url = f'{LIST_URL}{recipe.id}/'
+    anon_client.get(LIST_URL)
+    anon_client.get(detail_url)
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.name = 'Новое название'
+        recipe.save()
+    assert anon_client.get(detail_url).data['name'] == 'Новое название'
+    names = [item['name'] for item in anon_client.get(LIST_URL).data[
+        'results'
+    ]]
+    assert 'Новое название' in names
+
+
+def test_author_change_keeps_other_author_pages(
+    anon_client, dataset, django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    first, second = dataset['authors'][:2]
+    anon_client.get(LIST_URL, {'author': second.id})
+    with django_capture_on_commit_callbacks(execute=True):
+        Recipes.objects.filter(author=first).first().save()
+    with django_assert_num_queries(0):
+        anon_client.get(LIST_URL, {'author': second.id})
+
+
+def test_author_profile_change_invalidates_recipes(
+    anon_client, dataset, django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    recipe = Recipes.objects.select_related('author').first()
+    author = recipe.author
+    urls = (
+        (LIST_URL, {}),
+        (LIST_URL, {'author': author.id}),
+        (f'{LIST_URL}{recipe.id}/', {}),
+    )
+    for url, params in urls:
+        anon_client.get(url, params)
+    with django_capture_on_commit_callbacks(execute=True):
+        author.save(update_fields=['last_login'])
+    with django_assert_num_queries(0):
+        anon_client.get(LIST_URL, {'author': author.id})
+    with django_capture_on_commit_callbacks(execute=True):
+        author.first_name = 'Переименованный'
+        author.save()
+    for url, params in urls:
+        data = anon_client.get(url, params).data
+        data = data['results'][0] if 'results' in data else data
+        assert data['author']['first_name'] == 'Переименованный'
+
+
+def test_stale_entry_served_while_rebuild_is_locked(
+    anon_client, dataset, django_assert_num_queries,
+    django_capture_on_commit_callbacks, monkeypatch,
+):
+    recipe = Recipes.objects.first()
+    stale = anon_client.get(LIST_URL).data
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.name = 'Обновлённый'
+        recipe.save()
+    monkeypatch.setattr(cache, 'add', lambda *args, **kwargs: False)
+    with django_assert_num_queries(0):
+        response = anon_client.get(LIST_URL)
+    assert response.data == stale
+    monkeypatch.undo()
+    fresh = anon_client.get(LIST_URL).data
+    assert fresh['results'][0]['name'] == 'Обновлённый'
+
+
+def test_stale_entry_expires_after_window(
+    anon_client, dataset, settings, django_capture_on_commit_callbacks,
+    monkeypatch,
+):
+    settings.RECIPES_CACHE_STALE_TIMEOUT = -1
+    recipe = Recipes.objects.first()
+    anon_client.get(LIST_URL)
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.name = 'Обновлённый'
+        recipe.save()
+    monkeypatch.setattr(cache, 'add', lambda *args, **kwargs: False)
+    response = anon_client.get(LIST_URL)
+    assert response.data['results'][0]['name'] == 'Обновлённый'
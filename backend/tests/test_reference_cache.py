@@ -0,0 +1,120 @@
+import time
+
+import pytest
+from django.core.management import call_command
+from django.db.models import QuerySet
+
+from recipes.cache import TAGS_CACHE, get_cache_version
+from recipes.management.commands import command_csv
+from recipes.models import Ingredients, Tag
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def reference():
+    Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+    Ingredients.objects.create(name='Мука', measurement_unit='г')
+
+
+@pytest.mark.parametrize('url', ('/api/tags/', '/api/ingredients/'))
+def test_etag_answers_not_modified_without_queries(
+    anon_client, reference, django_assert_num_queries, url,
+):
+    response = anon_client.get(url)
+    assert response.status_code == 200
+    assert response['ETag']
+    assert response['Last-Modified']
+    assert 'no-cache' in response['Cache-Control']
+    with django_assert_num_queries(0):
+        response = anon_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+    assert response.status_code == 304
+    assert not response.content
+
+
+def test_if_modified_since_answers_not_modified(anon_client, reference):
+    response = anon_client.get('/api/tags/')
+    response = anon_client.get(
+        '/api/tags/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+    )
+    assert response.status_code == 304
+
+
+def test_retrieve_is_cached_per_object(anon_client, reference):
+    tag = Tag.objects.get()
+    response = anon_client.get(f'/api/tags/{tag.id}/')
+    assert response.status_code == 200
+    assert response.data['slug'] == 'breakfast'
+    assert anon_client.get(f'/api/tags/{tag.id + 1}/').status_code == 404
+
+
+def test_admin_change_invalidates_tags(
+    anon_client, admin_client, reference, django_capture_on_commit_callbacks,
+):
+    etag = anon_client.get('/api/tags/')['ETag']
+    tag = Tag.objects.get()
+    with django_capture_on_commit_callbacks(execute=True):
+        response = admin_client.post(
+            f'/admin/recipes/tag/{tag.id}/change/',
+            {'name': 'Обед', 'color': '#49B64E', 'slug': 'lunch'},
+        )
+    assert response.status_code == 302
+    response = anon_client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data[0]['slug'] == 'lunch'
+
+
+def test_command_csv_invalidates_ingredients(
+    anon_client, reference, tmp_path, monkeypatch,
+    django_capture_on_commit_callbacks,
+):
+    (tmp_path / 'ingredients.csv').write_text(
+        'name,measurement_unit\nСахар,г\n', encoding='UTF-8'
+    )
+    (tmp_path / 'tags.csv').write_text(
+        'name,color,slug\nОбед,#49B64E,lunch\n', encoding='UTF-8'
+    )
+    monkeypatch.setattr(command_csv, 'CSV_PATH', f'{tmp_path}/')
+    ingredients_etag = anon_client.get('/api/ingredients/')['ETag']
+    tags_etag = anon_client.get('/api/tags/')['ETag']
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('command_csv')
+    response = anon_client.get(
+        '/api/ingredients/', HTTP_IF_NONE_MATCH=ingredients_etag
+    )
+    assert response.status_code == 200
+    assert len(response.data) == 2
+    response = anon_client.get('/api/tags/', HTTP_IF_NONE_MATCH=tags_etag)
+    assert response.status_code == 200
+    assert len(response.data) == 2
+
+
+def test_cached_responses_expire(
+    anon_client, reference, settings, monkeypatch,
+):
+    assert anon_client.get('/api/tags/').data[0]['slug'] == 'breakfast'
+    # Изменение без инвалидации, как из процесса с другим кэшем.
+    QuerySet.update(Tag.objects.all(), slug='lunch')
+    assert anon_client.get('/api/tags/').data[0]['slug'] == 'breakfast'
+    expired = time.time() + settings.REFERENCE_CACHE_TIMEOUT + 1
+    monkeypatch.setattr(time, 'time', lambda: expired)
+    assert anon_client.get('/api/tags/').data[0]['slug'] == 'lunch'
+
+
+@pytest.mark.parametrize('change', (
+    lambda: Tag.objects.create(name='Обед', color='#49B64E', slug='lunch'),
+    lambda: Tag.objects.update(name='Обед'),
+))
+def test_tags_invalidated_only_after_commit(
+    reference, change, django_capture_on_commit_callbacks,
+):
+    version = get_cache_version(TAGS_CACHE)
+    with django_capture_on_commit_callbacks() as callbacks:
+        change()
+    # До фиксации читатель видит старые строки и старую версию.
+    assert get_cache_version(TAGS_CACHE) == version
+    for callback in callbacks:
+        callback()
+    assert get_cache_version(TAGS_CACHE) > version
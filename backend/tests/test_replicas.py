@@ -0,0 +1,138 @@
+import pytest
+from django.db import OperationalError, connections
+
+from foodgram import routers
+from foodgram.routers import PrimaryReplicaRouter, check_connection
+from tests.conftest import _client_for
+
+# Реплика в тестах - то же соединение, что и default; вне транзакции
+# теста, иначе чтения остаются в основной базе.
+replica_db = pytest.mark.django_db(transaction=True)
+
+
+class FakeConnection:
+    connection = None
+    in_atomic_block = False
+
+    def __init__(self, connection=None, health_checks=True, usable=True):
+        self.connection = connection
+        self.settings_dict = {'CONN_HEALTH_CHECKS': health_checks}
+        self.usable = usable
+        self.checks = 0
+
+    def is_usable(self):
+        self.checks += 1
+        return self.usable
+
+    def close(self):
+        self.connection = None
+
+    def ensure_connection(self):
+        raise OperationalError('replica is down')
+
+
+@pytest.fixture
+def replica(settings):
+    settings.DATABASE_REPLICAS = ['replica']
+    connections['replica'] = connections['default']
+    routers.unavailable.clear()
+    yield 'replica'
+    del connections['replica']
+    routers.unavailable.clear()
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """Базы, выбранные маршрутизатором для чтений."""
+    aliases = []
+    db_for_read = PrimaryReplicaRouter.db_for_read
+
+    def spy(self, model, **hints):
+        alias = db_for_read(self, model, **hints)
+        aliases.append(alias)
+        return alias
+
+    monkeypatch.setattr(PrimaryReplicaRouter, 'db_for_read', spy)
+    return aliases
+
+
+@replica_db
+def test_safe_reads_use_replica(replica, reads, anon_client, dataset):
+    reads.clear()
+    assert anon_client.get('/api/recipes/').status_code == 200
+    assert reads and set(reads) == {'replica'}
+
+
+@replica_db
+def test_write_pins_client_to_primary(
+    replica, reads, user, user_client, dataset,
+):
+    recipe = dataset['recipes'][1]
+    user.favourite.filter(recipe=recipe).delete()
+    url = f'/api/recipes/{recipe.id}/'
+    response = user_client.post(f'{url}favorite/')
+    assert response.status_code == 201
+    assert 'db_pin' in response.cookies
+    reads.clear()
+    assert user_client.get(url).data['is_favorited'] is True
+    assert set(reads) == {'default'}
+    # Клиент API без cookie закреплён по токену.
+    reads.clear()
+    _client_for(user).get('/api/recipes/')
+    assert set(reads) == {'default'}
+    reads.clear()
+    _client_for(dataset['authors'][0]).get('/api/recipes/')
+    assert set(reads) == {'replica'}
+
+
+@replica_db
+def test_failed_write_does_not_pin(replica, reads, user_client, dataset):
+    response = user_client.delete('/api/recipes/999999/favorite/')
+    assert response.status_code == 400
+    assert 'db_pin' not in response.cookies
+    reads.clear()
+    user_client.get('/api/recipes/')
+    assert set(reads) == {'replica'}
+
+
+@replica_db
+def test_pin_window_is_configurable(
+    replica, reads, user_client, dataset, settings,
+):
+    settings.DATABASE_REPLICA_PIN_SECONDS = 0
+    recipe = dataset['recipes'][1]
+    user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    reads.clear()
+    user_client.get('/api/recipes/')
+    assert set(reads) == {'replica'}
+
+
+@replica_db
+def test_unavailable_replica_falls_back_to_primary(
+    replica, reads, anon_client, dataset,
+):
+    connections['replica'] = FakeConnection()
+    reads.clear()
+    assert anon_client.get('/api/recipes/').status_code == 200
+    assert set(reads) == {'default'}
+    assert 'replica' in routers.unavailable
+    assert routers.choose_replica() is None
+
+
+@pytest.mark.parametrize('health_checks, usable, closed', (
+    (True, False, True),
+    (True, True, False),
+    (False, False, False),
+))
+def test_health_check_once_per_request(health_checks, usable, closed):
+    connection = FakeConnection(object(), health_checks, usable)
+    connections['checked'] = connection
+    token = routers.checked_connections.set(set())
+    try:
+        check_connection('checked')
+        check_connection('checked')
+    finally:
+        routers.checked_connections.reset(token)
+        del connections['checked']
+    assert connection.checks == int(health_checks)
+    assert (connection.connection is None) == closed
@@ -0,0 +1,63 @@
+import csv
+import io
+
+import pytest
+
+from recipes.models import IngredientsInRecipe, Shopping_cart
+
+pytestmark = pytest.mark.django_db
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+def content(response):
+    return b''.join(response.streaming_content).decode()
+
+
+def expected_totals(user):
+    totals = {}
+    for item in IngredientsInRecipe.objects.filter(
+        recipe__in=Shopping_cart.objects.filter(user=user).values('recipe')
+    ).select_related('ingredient'):
+        key = (item.ingredient.name, item.ingredient.measurement_unit)
+        totals[key] = totals.get(key, 0) + item.amount
+    return totals
+
+
+def test_txt_is_default_and_streamed(user, user_client, dataset):
+    response = user_client.get(URL)
+    assert response.status_code == 200
+    assert response.streaming
+    assert response['Content-Disposition'] == (
+        'attachment; filename=reader_shopping_list.txt'
+    )
+    lines = content(response).split('\n')
+    assert lines[0] == 'Список покупок:'
+    assert lines[1:] == [
+        f'- {name} ({unit}) - {amount}'
+        for (name, unit), amount in sorted(expected_totals(user).items())
+    ]
+
+
+def test_csv_export(user, user_client, dataset):
+    response = user_client.get(URL, {'file_format': 'csv'})
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/csv')
+    rows = list(csv.reader(io.StringIO(content(response))))
+    assert rows[0] == ['Ингредиент', 'Единица измерения', 'Количество']
+    assert {
+        (name, unit): int(amount) for name, unit, amount in rows[1:]
+    } == expected_totals(user)
+
+
+def test_pdf_export(user_client, dataset):
+    response = user_client.get(URL, {'file_format': 'pdf'})
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/pdf'
+    assert 'reader_shopping_list.pdf' in response['Content-Disposition']
+    assert b''.join(response.streaming_content).startswith(b'%PDF')
+
+
+def test_unknown_format_rejected(user_client, dataset):
+    response = user_client.get(URL, {'file_format': 'docx'})
+    assert response.status_code == 400
@@ -0,0 +1,50 @@
+import pytest
+
+from recipes.models import Recipes
+
+pytestmark = pytest.mark.django_db
+
+
+def expected_recipes(author, limit=None):
+    recipes = Recipes.objects.filter(author=author).order_by('-id')
+    if limit is not None:
+        recipes = recipes[:limit]
+    return [recipe.id for recipe in recipes]
+
+
+@pytest.mark.parametrize('limit', (None, 0, 1, 3, 100))
+def test_subscriptions_recipes_limit(user_client, dataset, limit):
+    url = '/api/users/subscriptions/?limit=50'
+    if limit is not None:
+        url += f'&recipes_limit={limit}'
+    response = user_client.get(url)
+    assert response.status_code == 200
+    authors = {author.id: author for author in dataset['authors'][::2]}
+    assert {item['id'] for item in response.data['results']} == set(authors)
+    for item in response.data['results']:
+        author = authors[item['id']]
+        assert item['is_subscribed'] is True
+        assert item['recipes_count'] == author.recipes.count()
+        assert [recipe['id'] for recipe in item['recipes']] == (
+            expected_recipes(author, limit)
+        )
+
+
+@pytest.mark.parametrize('limit', ('abc', '-1'))
+def test_subscriptions_invalid_recipes_limit(user_client, dataset, limit):
+    response = user_client.get(
+        f'/api/users/subscriptions/?recipes_limit={limit}'
+    )
+    assert response.status_code == 400
+
+
+def test_subscribe_respects_recipes_limit(user_client, dataset):
+    author = dataset['authors'][1]
+    response = user_client.post(
+        f'/api/users/{author.id}/subscribe/?recipes_limit=2'
+    )
+    assert response.status_code == 201
+    assert response.data['recipes_count'] == author.recipes.count()
+    assert [recipe['id'] for recipe in response.data['recipes']] == (
+        expected_recipes(author, 2)
+    )
@@ -0,0 +1,92 @@
+import json
+import logging
+import re
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from foodgram.middleware import timed_queries
+
+pytestmark = pytest.mark.django_db
+
+SERVER_TIMING = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", serializer;dur=([\d.]+), '
+    r'view;dur=[\d.]+, total;dur=[\d.]+'
+)
+
+
+@pytest.fixture
+def caplog(caplog):
+    """Журнал foodgram.timing не передаёт записи корневому логгеру."""
+    logger = logging.getLogger('foodgram.timing')
+    logger.addHandler(caplog.handler)
+    caplog.set_level(logging.INFO, logger='foodgram.timing')
+    yield caplog
+    logger.removeHandler(caplog.handler)
+
+
+def records(caplog, level):
+    return [
+        json.loads(record.getMessage()) for record in caplog.records
+        if record.name == 'foodgram.timing' and record.levelno == level
+    ]
+
+
+def test_server_timing_counts_queries(user_client, dataset):
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.get('/api/recipes/')
+    match = SERVER_TIMING.fullmatch(response['Server-Timing'])
+    assert match, response['Server-Timing']
+    assert int(match[1]) == len(context.captured_queries)
+    assert float(match[2]) > 0
+
+
+def test_request_log_line(user_client, dataset, caplog):
+    user_client.get('/api/tags/')
+    user_client.post(f'/api/recipes/{dataset["recipes"][1].id}/favorite/')
+    tags, favorite = records(caplog, logging.INFO)
+    assert tags['action'] == 'tags.list'
+    assert tags['status'] == 200
+    assert favorite['action'] == 'recipes.favorite'
+    assert favorite['queries'] > 0
+    assert 'sql' not in favorite
+
+
+def test_slow_request_logs_sql(user_client, dataset, settings, caplog):
+    settings.REQUEST_TIMING_SLOW_MS = 0
+    user_client.get('/api/users/subscriptions/')
+    [record] = records(caplog, logging.WARNING)
+    assert record['action'] == 'users.subscriptions'
+    assert len(record['sql']) == record['queries']
+    assert all('FROM' in query['sql'] for query in record['sql'])
+
+
+def test_slow_request_sampling(user_client, dataset, settings, caplog):
+    settings.REQUEST_TIMING_SLOW_MS = 0
+    settings.REQUEST_TIMING_SLOW_SAMPLE_RATE = 0
+    user_client.get('/api/tags/')
+    assert not records(caplog, logging.WARNING)
+    assert records(caplog, logging.INFO)
+
+
+def test_server_timing_header_can_be_disabled(
+    user_client, dataset, settings,
+):
+    settings.REQUEST_TIMING_HEADER = False
+    response = user_client.get('/api/tags/')
+    assert 'Server-Timing' not in response
+
+
+def test_query_wrapper_removed_after_request(user_client, dataset):
+    wrappers = list(connection.execute_wrappers)
+    user_client.get('/api/tags/')
+    user_client.post(f'/api/recipes/{dataset["recipes"][1].id}/favorite/')
+    assert connection.execute_wrappers == wrappers
+
+
+def test_nested_query_wrappers_count_once(user_client, dataset):
+    with timed_queries(), CaptureQueriesContext(connection) as context:
+        response = user_client.get('/api/recipes/')
+    match = SERVER_TIMING.fullmatch(response['Server-Timing'])
+    assert int(match[1]) == len(context.captured_queries)
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+import pytest
+from django.db import connections
+
+from recipes.models import Favourite, Shopping_cart
+from tests.conftest import _client_for
+from users.models import Subscribe
+
+pytestmark = pytest.mark.django_db
+
+THREADS = 8
+
+
+@pytest.mark.parametrize('action, model', (
+    ('favorite', Favourite),
+    ('shopping_cart', Shopping_cart),
+))
+def test_repeated_toggle_is_rejected_without_duplicates(
+    user, user_client, dataset, action, model,
+):
+    recipe = dataset['recipes'][1]
+    model.objects.filter(user=user, recipe=recipe).delete()
+    url = f'/api/recipes/{recipe.id}/{action}/'
+    assert user_client.post(url).status_code == 201
+    assert user_client.post(url).status_code == 400
+    assert model.objects.filter(user=user, recipe=recipe).count() == 1
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert not model.objects.filter(user=user, recipe=recipe).exists()
+
+
+@pytest.mark.parametrize('action', ('favorite', 'shopping_cart'))
+def test_toggle_missing_recipe(user_client, dataset, action):
+    url = f'/api/recipes/999999/{action}/'
+    assert user_client.post(url).status_code == 404
+    assert user_client.delete(url).status_code == 400
+
+
+def test_repeated_subscribe_is_rejected(user, user_client, dataset):
+    author = dataset['authors'][1]
+    Subscribe.objects.filter(user=user, author=author).delete()
+    url = f'/api/users/{author.id}/subscribe/'
+    response = user_client.post(url)
+    assert response.status_code == 201
+    assert response.data['is_subscribed'] is True
+    assert user_client.post(url).status_code == 400
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert not Subscribe.objects.filter(user=user, author=author).exists()
+
+
+def concurrently(user, method, url):
+    """Отправляет один и тот же запрос из нескольких потоков
+    одновременно и возвращает коды ответов."""
+    barrier = Barrier(THREADS)
+
+    def send(_):
+        client = _client_for(user)
+        try:
+            barrier.wait()
+            return getattr(client, method)(url).status_code
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        return sorted(executor.map(send, range(THREADS)))
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('url, model, lookup', (
+    ('/api/recipes/{recipe}/favorite/', Favourite, 'recipe'),
+    ('/api/recipes/{recipe}/shopping_cart/', Shopping_cart, 'recipe'),
+    ('/api/users/{author}/subscribe/', Subscribe, 'author'),
+))
+def test_concurrent_toggles(user, dataset, url, model, lookup):
+    recipe, author = dataset['recipes'][1], dataset['authors'][1]
+    target = recipe if lookup == 'recipe' else author
+    model.objects.filter(user=user, **{lookup: target}).delete()
+    url = url.format(recipe=recipe.id, author=author.id)
+
+    statuses = concurrently(user, 'post', url)
+    assert statuses == [201] + [400] * (THREADS - 1)
+    assert model.objects.filter(user=user, **{lookup: target}).count() == 1
+
+    statuses = concurrently(user, 'delete', url)
+    assert statuses == [204] + [400] * (THREADS - 1)
+    assert not model.objects.filter(user=user, **{lookup: target}).exists()
@@ -0,0 +1,128 @@
+import base64
+import json
+import struct
+import zlib
+from io import BytesIO
+
+import pytest
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from recipes.fields import StreamingBase64ImageField
+from recipes.models import Recipes
+from tests.test_query_budget import recipe_payload
+
+pytestmark = pytest.mark.django_db
+
+
+def encode(width, height, image_format='PNG'):
+    output = BytesIO()
+    Image.new('RGB', (width, height), '#49B64E').save(
+        output, format=image_format
+    )
+    content = output.getvalue()
+    return content, base64.b64encode(content).decode()
+
+
+def png_header(width, height):
+    """PNG из одного заголовка с заданными размерами, без пикселей."""
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data))
+        )
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    content = (
+        b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IEND', b'')
+    )
+    return base64.b64encode(content).decode()
+
+
+def post_recipe(client, dataset, image):
+    payload = recipe_payload(dataset)
+    payload['image'] = image
+    return client.post('/api/recipes/', payload, format='json')
+
+
+def test_decoded_file_matches_upload(user_client, dataset, monkeypatch):
+    monkeypatch.setattr(StreamingBase64ImageField, 'CHUNK_SIZE', 16)
+    content, encoded = encode(120, 80)
+    wrapped = '\n'.join(
+        encoded[offset:offset + 76] for offset in range(0, len(encoded), 76)
+    )
+    response = post_recipe(
+        user_client, dataset, f'data:image/png;base64,{wrapped}'
+    )
+    assert response.status_code == 201, response.data
+    recipe = Recipes.objects.get(pk=response.data['id'])
+    assert recipe.image.name.endswith('.png')
+    with default_storage.open(recipe.image.name) as file:
+        assert file.read() == content
+
+
+def test_image_size_checked_before_decoding(
+    user_client, dataset, settings, monkeypatch,
+):
+    settings.RECIPE_IMAGE_MAX_SIZE = 100
+    monkeypatch.setattr(
+        StreamingBase64ImageField, 'decode',
+        lambda *args: pytest.fail('Изображение не должно декодироваться'),
+    )
+    _, encoded = encode(200, 200)
+    response = post_recipe(user_client, dataset, encoded)
+    assert response.status_code == 400
+    assert 'image' in response.data
+
+
+def test_dimensions_checked_from_header(user_client, dataset, settings):
+    settings.RECIPE_IMAGE_MAX_DIMENSION = 100
+    _, encoded = encode(150, 20)
+    response = post_recipe(user_client, dataset, encoded)
+    assert response.status_code == 400
+    assert 'image' in response.data
+
+
+@pytest.mark.parametrize('width, height', ((9000, 9000), (20000, 20000)))
+def test_huge_dimensions_rejected(user_client, dataset, width, height):
+    # 20000x20000 больше предела Pillow, и Image.open отказывает сам.
+    response = post_recipe(user_client, dataset, png_header(width, height))
+    assert response.status_code == 400
+    assert 'пикселей' in str(response.data['image'])
+
+
+def test_huge_dimensions_fail_only_their_import_item(user_client, dataset):
+    items = [recipe_payload(dataset) for _ in range(2)]
+    items[0]['image'] = png_header(20000, 20000)
+    response = user_client.post(
+        '/api/recipes/import/', items, format='json'
+    )
+    assert response.status_code == 200
+    assert response.data['created'] == 1
+    assert 'image' in response.data['results'][0]['errors']
+
+
+@pytest.mark.parametrize('image', (
+    'не base64!',
+    base64.b64encode(b'plain text, not an image').decode(),
+    encode(10, 10, 'BMP')[1],
+    encode(10, 10)[1][:-3],
+))
+def test_invalid_images_rejected(user_client, dataset, image):
+    response = post_recipe(user_client, dataset, image)
+    assert response.status_code == 400
+    assert 'image' in response.data
+    assert not Recipes.objects.filter(name='Новый рецепт').exists()
+
+
+def test_oversized_body_rejected_before_parsing(
+    user_client, dataset, settings, django_assert_max_num_queries,
+):
+    settings.RECIPE_UPLOAD_MAX_BODY = 1024
+    payload = recipe_payload(dataset)
+    payload['image'] = encode(100, 100)[1] * 4
+    with django_assert_max_num_queries(1):
+        response = user_client.post(
+            '/api/recipes/', json.dumps(payload),
+            content_type='application/json',
+        )
+    assert response.status_code == 413
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Value
 
 from foodgram.settings import LENGTH_NAME
 
@@ -77,3 +78,16 @@ class Subscribe(models.Model):
                 name='unique_subscribe'
             )
         ]
+
+
+def annotate_is_subscribed(queryset, user):
+    """Добавляет к выборке пользователей признак подписки на них user."""
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_subscribed=Exists(Subscribe.objects.filter(
+            user=user, author=OuterRef('pk')
+        ))
+    )
@@ -2,9 +2,26 @@ from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
 
 from users.models import Subscribe, User
+from recipes.fields import ImageVariantsField
 from recipes.models import Recipes
 
 
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не передан."""
+    limit = request.query_params.get('recipes_limit')
+    if not limit:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = -1
+    if limit < 0:
+        raise serializers.ValidationError(
+            {'recipes_limit': 'Ожидается неотрицательное целое число.'}
+        )
+    return limit
+
+
 class UserSerializer(UserSerializer):
     """Сериализатор для модели User."""
 
@@ -22,6 +39,8 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -71,14 +90,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         read_only_fields = ('email', 'username')
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = RecipeReadShortSerializer(
             recipes,
             many=True,
@@ -87,11 +110,14 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return Subscribe.objects.filter(user=user, author=obj).exists()
 
 
 class RecipeReadShortSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(sizes=('small', 'medium'))
 
     class Meta:
         model = Recipes
@@ -99,5 +125,6 @@ class RecipeReadShortSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time',
         )
@@ -1,18 +1,35 @@
+from django.db.models import (
+    BooleanField,
+    Count,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import exceptions, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-
+from foodgram.db import insert_ignore
+from recipes.models import Recipes
 from recipes.pagination import CustomPaginator
-from .models import Subscribe, User
-from .serializers import SubscriptionSerializer
+from .models import Subscribe, User, annotate_is_subscribed
+from .serializers import SubscriptionSerializer, get_recipes_limit
 
 
 class CustomUserViewSet(UserViewSet):
     pagination_class = CustomPaginator
 
+    def get_queryset(self):
+        return annotate_is_subscribed(
+            super().get_queryset(), self.request.user
+        )
+
     @action(
         detail=False,
         methods=('get',),
@@ -21,8 +38,31 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(subscribing__user=user)
+        limit = get_recipes_limit(request)
+        recipes_count = Recipes.objects.filter(
+            author=OuterRef('pk')
+        ).order_by().values('author').annotate(
+            count=Count('id')
+        ).values('count')
+        queryset = User.objects.filter(subscribing__user=user).annotate(
+            recipes_count=Coalesce(
+                Subquery(recipes_count, output_field=IntegerField()), 0
+            ),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        )
         page = self.paginate_queryset(queryset)
+        # Рецепты всех авторов страницы выбираются одним запросом вместо
+        # отдельного запроса на каждого автора.
+        prefetch_related_objects(page, Prefetch(
+            'recipes',
+            queryset=Recipes.objects.top_per_author(
+                [author.id for author in page], limit
+            ).only(
+                'id', 'name', 'image', 'image_variants', 'cooking_time',
+                'author_id',
+            ),
+            to_attr='limited_recipes',
+        ))
         serializer = SubscriptionSerializer(
             page,
             many=True,
@@ -37,43 +77,30 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscribe(self, request, **kwargs):
         user = request.user
-        if request.method == 'POST':
-            author_id = self.kwargs.get('id')
-            author = get_object_or_404(User, id=author_id)
-            if user == author:
-                raise exceptions.ValidationError(
-                    {'detail': 'Подписаться на самого себя нельзя!'},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            elif Subscribe.objects.filter(
-                user=user,
-                author=author
-            ).exists():
-                raise exceptions.ValidationError(
-                    {'detail': 'Вы уже подписаны на этого автора!'},
-                    code=status.HTTP_400_BAD_REQUEST
-                )
-            Subscribe.objects.create(user=user, author=author)
-            serializer = SubscriptionSerializer(
-                author,
-                context={'request': request}
-            )
-
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            try:
-                author_id = self.kwargs.get('id')
-                author = get_object_or_404(User, id=author_id)
-                subscription = get_object_or_404(
-                    Subscribe,
-                    user=user,
-                    author=author
-                )
-            except Exception:
+            deleted, _ = Subscribe.objects.filter(
+                user=user, author_id=self.kwargs['id']
+            ).delete()
+            if not deleted:
                 raise exceptions.ValidationError(
                     {'detail': 'Невозможно выполнить!'},
                     code=status.HTTP_400_BAD_REQUEST
                 )
-            subscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+        author = get_object_or_404(User, id=self.kwargs['id'])
+        if user == author:
+            raise exceptions.ValidationError(
+                {'detail': 'Подписаться на самого себя нельзя!'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        if not insert_ignore(Subscribe, user=user, author=author):
+            raise exceptions.ValidationError(
+                {'detail': 'Вы уже подписаны на этого автора!'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        author.is_subscribed = True
+        serializer = SubscriptionSerializer(
+            author,
+            context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)